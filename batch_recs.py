@@ -0,0 +1,182 @@
+"""Batched AI recommendation generation for many answer profiles per API call.
+
+Profiles are packed into one request per chunk: the question legend and the
+shared rules are sent once, each profile is a short line keyed by an id,
+and a strict JSON schema makes the reply come back per id. Every profile's
+books then go through the same cleaning as the single-profile path.
+
+    python batch_recs.py [--model gpt-4o-mini] [--chunk 12] [--limit N] [--profiles FILE] [--out results.jsonl]
+
+Without --profiles it covers every distinct (focus_genres, top_situations)
+outcome and writes the results into the shared recommendation cache the
+app reads (rec_cache.py).
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+from core import LETTERS, encode_letters, question_choices, questions
+from llm import PROMPT_RULES, book_schema, clean_recommendations
+from openai_client import OpenAIError, get_client, parse_json_content
+from profile_table import load_or_build
+from rec_cache import RecCache, common_profiles, read_profiles
+
+
+class BatchProfile(NamedTuple):
+    id: str
+    letters: str
+    focus_genres: List[str]
+    top_situations: List[str]
+
+
+BATCH_SYSTEM_PROMPT = (
+    "너는 한국의 독서 큐레이터다.\n"
+    "반드시 '한국어로 출간/유통되는 책(국내 도서 또는 한국어 번역서)'만 추천해라.\n"
+    "여러 사용자의 설문 결과가 한 번에 주어진다. 각 사용자(id)마다 3권씩 추천해라.\n"
+    "답변은 질문 번호 순서의 보기 글자(A~E)로 주어지며, 보기 내용은 아래 질문표를 참고해라.\n\n"
+    + PROMPT_RULES
+)
+
+
+def question_legend() -> str:
+    lines = []
+    for q, choices in zip(questions, question_choices):
+        lines.append(q)
+        lines += [f"  {c}" for c in choices]
+    return "\n".join(lines)
+
+
+def batch_schema() -> dict:
+    result = {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "recommendations": {"type": "array", "items": book_schema()},
+        },
+        "required": ["id", "recommendations"],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "batch_recommendations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"results": {"type": "array", "items": result}},
+                "required": ["results"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def batch_payload(model: str, profiles: List[BatchProfile]) -> dict:
+    rows = [
+        json.dumps(
+            {"id": p.id, "focus_genres": p.focus_genres, "top_situations": p.top_situations, "answers": p.letters},
+            ensure_ascii=False,
+        )
+        for p in profiles
+    ]
+    user = "질문표:\n" + question_legend() + "\n\n사용자 목록:\n" + "\n".join(rows)
+    return {
+        "model": model,
+        "temperature": 0.6,
+        "response_format": batch_schema(),
+        "messages": [{"role": "system", "content": BATCH_SYSTEM_PROMPT}, {"role": "user", "content": user}],
+    }
+
+
+def split_results(obj: dict, profiles: List[BatchProfile]) -> Dict[str, List[dict]]:
+    """Cleaned books per profile id; profiles without exactly 3 valid books are left out."""
+    by_id = {p.id: p for p in profiles}
+    out = {}
+    for r in obj.get("results", []):
+        if not isinstance(r, dict):
+            continue
+        p = by_id.get(str(r.get("id", "")))
+        if p is None or p.id in out:
+            continue
+        books = clean_recommendations(r.get("recommendations", []), p.focus_genres)
+        if len(books) == 3:
+            out[p.id] = books
+    return out
+
+
+def recommend_batch(api_key: str, model: str, profiles: List[BatchProfile]) -> Dict[str, List[dict]]:
+    body = get_client().chat_completion(api_key, batch_payload(model, profiles))
+    return split_results(parse_json_content(body), profiles)
+
+
+def make_profiles(letters_list: List[str]) -> List[BatchProfile]:
+    table = load_or_build()
+    out = []
+    for letters in letters_list:
+        if len(letters) != len(questions) or any(l not in LETTERS for l in letters):
+            raise ValueError(f"not an answer-letter profile: {letters!r}")
+        p = table.lookup(encode_letters(letters))
+        out.append(BatchProfile(letters, letters, p.focus_genres, p.top_situations))
+    return out
+
+
+def run_batches(
+    api_key: str, model: str, profiles: List[BatchProfile], chunk: int = 12, workers: int = 4
+) -> Dict[str, List[dict]]:
+    chunks = [profiles[i:i + chunk] for i in range(0, len(profiles), chunk)]
+
+    def one(ps: List[BatchProfile]) -> Dict[str, List[dict]]:
+        try:
+            return recommend_batch(api_key, model, ps)
+        except OpenAIError as e:
+            print(f"batch of {len(ps)} failed: {e}", file=sys.stderr)
+            return {}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for part in ex.map(one, chunks):
+            results.update(part)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Generate AI recommendations for many profiles in batched requests.")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--profiles", help="file with one answer-letter string per line, '-' for stdin")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--chunk", type=int, default=12, help="profiles per request")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--cache", default=None, help="recommendation cache file (default: the app's)")
+    ap.add_argument("--out", help="also write {letters, focus_genres, top_situations, books} JSONL here")
+    args = ap.parse_args(argv)
+
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        print("OPENAI_API_KEY is not set", file=sys.stderr)
+        return 2
+
+    letters_list = read_profiles(args.profiles)[: args.limit] if args.profiles else common_profiles(args.limit)
+    profiles = make_profiles(letters_list)
+    results = run_batches(api_key, args.model, profiles, chunk=args.chunk, workers=args.workers)
+
+    cache = RecCache(args.cache) if args.cache else RecCache()
+    for p in profiles:
+        if p.id in results:
+            cache.put_profile(args.model, p.focus_genres, p.top_situations, p.letters, results[p.id])
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for p in profiles:
+                if p.id in results:
+                    row = {"letters": p.letters, "focus_genres": p.focus_genres, "top_situations": p.top_situations}
+                    f.write(json.dumps({**row, "books": results[p.id]}, ensure_ascii=False) + "\n")
+
+    print(f"{len(results)}/{len(profiles)} profiles filled in {(len(profiles) + args.chunk - 1) // args.chunk} requests")
+    return 0 if len(results) == len(profiles) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Burst of concurrent sessions on one process's AI request path.
+
+Does per session what app.py does: a speculative prefetch for the pinned
+profile (Prefetcher.acquire), then the click taking it over or submitting
+its own request, raced against the latency budget (hedge.py). With more
+sessions at once than the prefetch pool has workers and a fixed stub
+latency below the budget, every session should get the AI result; a
+request waiting for a pool worker shows up as a local fallback, i.e. an
+ai_share below 1.
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from bench.stats import summarize
+from core import NUM_PROFILES, answers_of, decode_letters
+
+
+def run(sessions: int = 8, latency: float = 3.0, budget: float = 4.0, stream: bool = True, seed: int = 0) -> List[dict]:
+    import llm
+    from bench.stub_openai import StubOpenAI
+    from hedge import race_ai_feeds
+    from prefetch import Prefetcher
+    from recommender import score
+
+    stub = StubOpenAI(latency=latency, jitter=0.0, seed=seed).start()
+    # read when this process creates its OpenAI client
+    os.environ["OPENAI_BASE_URL"] = stub.url
+    fetch = llm.stream_books_korean_only if stream else llm.ai_pick_books_korean_only
+    pf = Prefetcher()
+    rng = random.Random(seed)
+    profiles = [decode_letters(rng.randrange(NUM_PROFILES)) for _ in range(sessions)]
+
+    def session(letters: str):
+        p = score(letters)
+        args = ("sk-bench", "gpt-4o-mini", answers_of(letters), p.focus_genres, p.top_situations)
+        key = f"{p.focus_genres}|{p.top_situations}|{letters}"
+        t0 = time.perf_counter()
+        prefetched = pf.acquire(key, fetch, *args)
+        feed = pf.take(key) or pf.submit(fetch, *args)
+        race = race_ai_feeds(feed, None, budget_s=budget)
+        pf.release(key, prefetched)
+        return race.winner, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as ex:
+            results = list(ex.map(session, profiles))
+    finally:
+        stub.stop()
+    rep = summarize(f"burst[{sessions} sessions, {latency}s upstream] first book", [t for _, t in results], time.perf_counter() - t0)
+    rep["ai_share"] = round(sum(w != "local" for w, _ in results) / sessions, 3)
+    return [rep]
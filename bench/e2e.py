@@ -0,0 +1,172 @@
+"""End-to-end benchmark: drive app.py through Streamlit's AppTest harness.
+
+Each simulated session loads the script, answers the seven questions and
+clicks "결과 보기"; the click run (scoring, optional AI race, rendering) is
+the click-to-render time. Concurrent sessions run in separate processes
+(AppTest cannot run scripts from several threads at once); they share the
+stub server and the on-disk recommendation cache, but not the per-process
+prefetch / single-flight state. With --ai the app talks to the local stub
+(bench/stub_openai.py) instead of OpenAI.
+"""
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from bench.stats import max_rss_kb, summarize
+from core import LETTERS, NUM_PROFILES, decode_letters
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def run_session(
+    letters: str, api_key: str = "", stream: bool = True, timeout: float = 60.0, app_path: str = APP_PATH
+) -> Dict[str, float]:
+    from streamlit.testing.v1 import AppTest
+
+    t0 = time.perf_counter()
+    at = AppTest.from_file(app_path, default_timeout=timeout).run()
+    t_load = time.perf_counter() - t0
+    if api_key:
+        at.sidebar.text_input[0].input(api_key)
+    if not stream:
+        at.sidebar.checkbox[0].uncheck()
+    for i, l in enumerate(letters):
+        r = at.radio(key=f"q{i+1}")
+        r.set_value(r.options[LETTERS.index(l)])
+    t0 = time.perf_counter()
+    at.run()
+    t_answer = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    at.button[0].click().run()
+    t_click = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(f"app raised for {letters}: {at.exception[0].value}")
+    result = at.session_state["result"]
+    return {"load": t_load, "answer": t_answer, "click": t_click, "used_ai": result.used_ai}
+
+
+def _worker(profiles: List[str], api_key: str, stream: bool) -> dict:
+    # the first session pays for imports and table loading; keep it out of the numbers
+    run_session(profiles[0], api_key, stream)
+    timings: Dict[str, List[float]] = {"load": [], "answer": [], "click": []}
+    ai_hits = 0
+    t0 = time.perf_counter()
+    for letters in profiles:
+        t = run_session(letters, api_key, stream)
+        for k in timings:
+            timings[k].append(t[k])
+        ai_hits += t["used_ai"]
+    return {"timings": timings, "wall": time.perf_counter() - t0, "ai_hits": ai_hits, "max_rss_kb": max_rss_kb()}
+
+
+def run(
+    sessions: int = 40,
+    concurrency: int = 4,
+    ai: bool = False,
+    stream: bool = True,
+    latency: float = 0.4,
+    error_rate: float = 0.0,
+    rate_429: float = 0.0,
+    seed: int = 0,
+) -> List[dict]:
+    stub = None
+    # keep benchmark submissions out of the app's event log
+    os.environ["EVENT_LOG_DIR"] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "events")
+    if ai:
+        from bench.stub_openai import StubOpenAI
+
+        stub = StubOpenAI(latency=latency, jitter=latency / 2, error_rate=error_rate, rate_429=rate_429, seed=seed).start()
+        # inherited by the session processes, read when the app creates its OpenAI client and cache
+        os.environ["OPENAI_BASE_URL"] = stub.url
+        os.environ["REC_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "rec_cache.sqlite3")
+
+    rng = random.Random(seed)
+    profiles = [decode_letters(rng.randrange(NUM_PROFILES)) for _ in range(sessions)]
+    api_key = "sk-bench" if ai else ""
+    shards = [profiles[i::concurrency] for i in range(concurrency) if profiles[i::concurrency]]
+    # AppTest is not thread-safe, so each concurrent session stream gets its own process
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=mp.get_context("spawn")) as ex:
+        parts = list(ex.map(_worker, shards, [api_key] * len(shards), [stream] * len(shards)))
+
+    wall = max(p["wall"] for p in parts)
+    tag = "ai" + ("-stream" if stream else "") if ai else "local"
+    out = []
+    for k in ("load", "answer", "click"):
+        out.append(summarize(f"e2e[{tag}] {k}", [t for p in parts for t in p["timings"][k]], wall))
+    out[-1]["worker_max_rss_kb"] = max(p["max_rss_kb"] for p in parts)
+    out[-1]["ai_share"] = round(sum(p["ai_hits"] for p in parts) / max(sessions, 1), 3)
+    if stub is not None:
+        out[-1]["stub"] = dict(stub.counts)
+        stub.stop()
+    return out
+
+
+def run_interactions(rounds: int = 50, app_path: str = APP_PATH, seed: int = 0) -> List[dict]:
+    """Rerun cost per radio click, before and after a result is on screen.
+
+    AppTest always reruns the whole script and adds its own overhead, so
+    next to the harness times this reports the app's own "script" spans
+    (full run) and "fragment" spans (the questionnaire fragment body, i.e.
+    what a fragment-scoped rerun in a real browser session costs).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    from metrics import metrics
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(app_path, default_timeout=60).run()
+    at.run()
+
+    def click_radios(n: int) -> List[float]:
+        out = []
+        for _ in range(n):
+            q = rng.randrange(7)
+            r = at.radio(key=f"q{q+1}")
+            r.set_value(r.options[rng.randrange(5)])
+            t0 = time.perf_counter()
+            at.run()
+            out.append(time.perf_counter() - t0)
+        return out
+
+    def spans(stage: str) -> List[float]:
+        return [sec for _, s, sec, _ in metrics.spans if s == stage]
+
+    click_radios(5)
+    metrics.spans.clear()
+    t0 = time.perf_counter()
+    before = click_radios(rounds)
+    wall_before = time.perf_counter() - t0
+    script_before, fragment_before = spans("script"), spans("fragment")
+
+    for i in range(7):
+        r = at.radio(key=f"q{i+1}")
+        if r.value is None:
+            r.set_value(r.options[0])
+    at.run()
+    at.button[0].click().run()
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    metrics.spans.clear()
+    t0 = time.perf_counter()
+    after = click_radios(rounds)
+    wall_after = time.perf_counter() - t0
+    script_after = spans("script")
+
+    out = [
+        summarize("AppTest run: radio click", before, wall_before),
+        summarize("AppTest run: click, result shown", after, wall_after),
+    ]
+    # script and fragment body time as recorded by the app itself, without the AppTest harness
+    for name, lat in [
+        ("script: radio click", script_before),
+        ("script: click, result shown", script_after),
+        ("fragment: questionnaire", fragment_before),
+    ]:
+        if lat:
+            out.append(summarize(name, lat, sum(lat)))
+    return out
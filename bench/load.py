@@ -0,0 +1,185 @@
+"""Load test for the multi-worker deployment (serve.py).
+
+Talks Streamlit's own websocket protocol (/_stcore/stream, protobuf
+BackMsg / ForwardMsg), the way a browser tab does: a session connects,
+runs the script once (page load), then sends all seven answers and the
+"결과 보기" click in one rerun and waits until the three book cards are
+in. Many sessions run concurrently from one asyncio loop; they are spread
+over the workers round-robin (what nginx's least_conn does for equally
+long sessions), or all go to --url, e.g. nginx itself.
+
+For each worker count the workers are started fresh with their own empty
+cache, rate-limit files and event log, so runs do not warm each other up.
+Throughput is completed sessions per second; on a host with fewer cores than
+workers (or with the load generator competing for them) it cannot scale.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bench.stats import summarize
+from core import LETTERS, NUM_PROFILES, decode_letters
+
+SUBMIT_LABEL = "결과 보기"
+
+
+class Session:
+    """One browser-like Streamlit session over a websocket."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.radios: Dict[str, Tuple[str, List[str]]] = {}
+        self.buttons: Dict[str, str] = {}
+        self.text_inputs: List[str] = []
+        # perf_counter when the first question appeared (time to first render)
+        self.first_radio_at: Optional[float] = None
+        # whether the first result shown came from the AI (before any late upgrade)
+        self.first_ai: Optional[bool] = None
+
+    async def run(self, widgets=()) -> int:
+        """One script run with the given WidgetStates; returns how many book cards are on screen after it."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(widgets)
+        await self.ws.send(msg.SerializeToString())
+        # element slot -> is a book card; streamed cards are drawn into slots that are cleared later
+        cards: Dict[tuple, bool] = {}
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                cards.clear()
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                el = fwd.delta.new_element
+                t = el.WhichOneof("type")
+                cards[tuple(fwd.metadata.delta_path)] = t == "markdown" and 'class="pill">#' in el.markdown.body
+                if t == "markdown" and self.first_ai is None and "기반 추천" in el.markdown.body:
+                    self.first_ai = "OpenAI 기반 추천" in el.markdown.body
+                if t == "radio":
+                    self.first_radio_at = self.first_radio_at or time.perf_counter()
+                    self.radios[el.radio.label] = (el.radio.id, list(el.radio.options))
+                elif t == "button":
+                    self.buttons[el.button.label] = el.button.id
+                elif t == "text_input":
+                    self.text_inputs.append(el.text_input.id)
+                elif t == "exception":
+                    raise RuntimeError(f"app raised: {el.exception.message}")
+            elif kind == "script_finished" and fwd.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                return sum(cards.values())
+
+    def answer_and_submit(self, letters: str, api_key: str = ""):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widgets = []
+        if api_key:
+            widgets.append(WidgetState(id=self.text_inputs[0], string_value=api_key))
+        for i, l in enumerate(letters):
+            wid, options = self.radios[f"q{i+1}"]
+            widgets.append(WidgetState(id=wid, string_value=options[LETTERS.index(l)]))
+        widgets.append(WidgetState(id=self.buttons[SUBMIT_LABEL], trigger_value=True))
+        return widgets
+
+
+async def run_session(url: str, letters: str, api_key: str = "") -> Dict[str, float]:
+    import websockets
+
+    t0 = time.perf_counter()
+    async with websockets.connect(f"{url}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as ws:
+        s = Session(ws)
+        await s.run()
+        t_load = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        cards = await s.run(s.answer_and_submit(letters, api_key))
+        t_click = time.perf_counter() - t1
+    if cards != 3:
+        raise RuntimeError(f"expected 3 book cards for {letters}, got {cards}")
+    return {"load": t_load, "click": t_click, "session": time.perf_counter() - t0, "ai": float(bool(s.first_ai))}
+
+
+async def drive(urls: List[str], profiles: List[str], concurrency: int, api_key: str = "") -> Tuple[Dict[str, List[float]], float, int]:
+    sem = asyncio.Semaphore(concurrency)
+    timings: Dict[str, List[float]] = {"load": [], "click": [], "session": [], "ai": []}
+    errors = 0
+
+    async def one(i: int, letters: str):
+        nonlocal errors
+        async with sem:
+            try:
+                t = await run_session(urls[i % len(urls)], letters, api_key)
+            except Exception:
+                errors += 1
+                return
+            for k, v in t.items():
+                timings[k].append(v)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i, l) for i, l in enumerate(profiles)))
+    return timings, time.perf_counter() - t0, errors
+
+
+def run(
+    workers: List[int],
+    sessions: int = 200,
+    concurrency: int = 16,
+    ai: bool = False,
+    latency: float = 0.4,
+    rps: float = 0.0,
+    base_port: int = 8601,
+    url: Optional[str] = None,
+    seed: int = 0,
+) -> List[dict]:
+    import serve
+
+    rng = random.Random(seed)
+    profiles = [decode_letters(rng.randrange(NUM_PROFILES)) for _ in range(sessions)]
+    stub = None
+    env = dict(os.environ)
+    if ai:
+        from bench.stub_openai import StubOpenAI
+
+        stub = StubOpenAI(latency=latency, jitter=latency / 2, seed=seed).start()
+        env["OPENAI_BASE_URL"] = stub.url
+        if rps:
+            env["OPENAI_RATE_LIMIT_RPS"] = str(rps)
+
+    out = []
+    base_rate = None
+    try:
+        for n in workers:
+            tmp = tempfile.mkdtemp(prefix=f"load-{n}-")
+            env["REC_CACHE_PATH"] = os.path.join(tmp, "rec_cache.sqlite3")
+            env["RATE_LIMIT_PATH"] = os.path.join(tmp, "ratelimit.sqlite3")
+            env["EVENT_LOG_DIR"] = os.path.join(tmp, "events")
+            ports = list(range(base_port, base_port + n))
+            procs = serve.start_workers(n, base_port, env=env, quiet=True)
+            try:
+                serve.wait_healthy(ports)
+                urls = [url] if url else [f"ws://127.0.0.1:{p}" for p in ports]
+                # one session per worker first: imports, table mmap and catalog load stay out of the numbers
+                asyncio.run(drive([f"ws://127.0.0.1:{p}" for p in ports], profiles[:n], n, "sk-bench" if ai else ""))
+                requests_before = stub.counts["requests"] if stub else 0
+                timings, wall, errors = asyncio.run(drive(urls, profiles, concurrency, "sk-bench" if ai else ""))
+            finally:
+                serve.stop(procs)
+            rep = summarize(f"load[workers={n}] session", timings["session"], wall)
+            base_rate = base_rate or rep["throughput_per_s"]
+            rep["scaling"] = round(rep["throughput_per_s"] / base_rate, 2) if base_rate else None
+            rep["errors"] = errors
+            if ai:
+                # share of sessions whose first result came from the AI within the latency budget
+                rep["ai_share"] = round(sum(timings["ai"]) / max(len(timings["ai"]), 1), 3)
+            if stub:
+                rep["openai_rps"] = round((stub.counts["requests"] - requests_before) / wall, 2)
+            out.append(rep)
+            out.append(summarize(f"load[workers={n}] click", timings["click"], wall))
+    finally:
+        if stub:
+            stub.stop()
+    return out
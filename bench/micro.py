@@ -0,0 +1,95 @@
+"""Microbenchmarks for the recommendation hot paths.
+
+Inputs are either a seeded random sample of answer profiles or every one
+of the 78,125 (exhaustive). Each benchmark times one call per profile.
+"""
+import json
+import os
+import random
+import tempfile
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from bench.stats import measure
+from core import (
+    NUM_PROFILES,
+    answers_of,
+    compute_genre_scores,
+    compute_situation_scores,
+    decode_letters,
+    encode_letters,
+    top_keys,
+)
+from event_log import EventLog
+from reasons import get_engine, reference_reasons, sample_books
+from recommender import (
+    build_result,
+    get_table,
+    pick_3_books,
+    recommend,
+    recommend_local,
+    score,
+    score_lines,
+    with_reasons,
+)
+from session_result import compact_result, expand
+from similarity import get_recommender
+
+
+def profile_codes(n: int = 20000, exhaustive: bool = False, seed: int = 0) -> List[int]:
+    if exhaustive:
+        return list(range(NUM_PROFILES))
+    rng = random.Random(seed)
+    return [rng.randrange(NUM_PROFILES) for _ in range(n)]
+
+
+def benchmarks(codes: List[int]) -> List[Tuple[str, Callable, list]]:
+    letters = [decode_letters(c) for c in codes]
+    answers = [answers_of(l) for l in letters]
+    profiles = [score(l) for l in letters]
+    books = [sample_books(l, p.top_genres, p.second_genres) for l, p in zip(letters, profiles)]
+    local = [recommend_local(p.genre_scores, p.situation_scores, noise=0.0) for p in profiles]
+    engine = get_engine()
+    table = get_table()
+    rec = get_recommender()
+    events = EventLog(os.path.join(tempfile.mkdtemp(prefix="bench-"), "events"))
+
+    # vectorized ranking and the batch CLI's per-chunk path, timed per 512-profile batch
+    chunk = 512
+    g_mat = np.array([[v for v in p.genre_scores.values()] for p in profiles], dtype=np.float64)
+    s_mat = np.array([[v for v in p.situation_scores.values()] for p in profiles], dtype=np.float64)
+    batches = [(g_mat[i:i + chunk], s_mat[i:i + chunk]) for i in range(0, len(codes), chunk)]
+    lines = [json.dumps({"answers": l}) for l in letters]
+    line_chunks = [(i + 1, lines[i:i + chunk]) for i in range(0, len(codes), chunk)]
+
+    return [
+        ("compute_genre_scores", compute_genre_scores, [(a,) for a in answers]),
+        ("compute_situation_scores", compute_situation_scores, [(a,) for a in answers]),
+        ("top_keys", top_keys, [(compute_genre_scores(a),) for a in answers]),
+        ("encode_letters", encode_letters, [(l,) for l in letters]),
+        ("ProfileTable.lookup", table.lookup, [(c,) for c in codes]),
+        ("pick_3_books", pick_3_books, [(p.top_genres, p.second_genres, p.top_situations) for p in profiles]),
+        ("recommend_local", recommend_local, [(p.genre_scores, p.situation_scores) for p in profiles]),
+        ("similarity.recommend_batch/512", rec.recommend_batch, batches),
+        ("build_reason_diversified x3", reference_reasons, [(l, b, p.top_situations) for l, b, p in zip(letters, books, profiles)]),
+        ("ReasonEngine.reasons x3", engine.reasons, [(l, b, p.top_situations) for l, b, p in zip(letters, books, profiles)]),
+        ("with_reasons", with_reasons, [(l, b, p.top_situations) for l, b, p in zip(letters, local, profiles)]),
+        ("build_result", build_result, [(l, p, (), b) for l, p, b in zip(letters, profiles, local)]),
+        ("compact_result", compact_result, [(l, p, (), b) for l, p, b in zip(letters, profiles, local)]),
+        ("expand (uncached)", expand.__wrapped__, [(compact_result(l, p, (), b),) for l, p, b in zip(letters, profiles, local)]),
+        ("EventLog.log", events.log, [(compact_result(l, p, (), b),) for l, p, b in zip(letters, profiles, local)]),
+        ("recommend (AI-free flow)", recommend, [(l,) for l in letters]),
+        ("score_lines/512", score_lines, line_chunks),
+    ]
+
+
+def run(n: int = 20000, exhaustive: bool = False, seed: int = 0, only: str = "") -> List[dict]:
+    random.seed(seed)
+    codes = profile_codes(n, exhaustive, seed)
+    out = []
+    for name, fn, inputs in benchmarks(codes):
+        if only and only not in name:
+            continue
+        out.append(measure(name, fn, inputs, warmup=min(100, len(inputs) // 10)))
+    return out
@@ -0,0 +1,132 @@
+"""Benchmark suite entry point (run from the repository root).
+
+    python -m bench.run micro [--n 20000 | --exhaustive] [--only reasons]
+    python -m bench.run rerun [--rounds 50] [--app app.py]
+    python -m bench.run startup [--rounds 5] [--app app.py]
+    python -m bench.run e2e [--sessions 40] [--concurrency 4] [--ai [--no-stream] [--latency 0.4] [--error-rate 0.02] [--rate-429 0.05]]
+    python -m bench.run load [--workers 1,2,4] [--sessions 200] [--concurrency 16] [--ai [--rps 5]] [--url ws://127.0.0.1:8080]
+    python -m bench.run burst [--sessions 8] [--latency 3.0] [--budget 4.0] [--no-stream]
+    python -m bench.run ... [--save [PATH]] [--compare [PATH]] [--fail-on-regression]
+
+--save writes the report as a baseline (default bench/baselines/<suite>.json,
+<suite> being micro, rerun, startup, load, burst, e2e-local, e2e-ai or e2e-ai-stream); --compare prints
+p50 / p99 / throughput ratios against one. A load baseline is only saved
+from a host with at least as many CPUs as the largest worker count, since
+it is the reference for multi-worker scaling. The stub server alone:
+python -m bench.stub_openai.
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from bench import stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Recommendation benchmarks: throughput, p50/p95/p99, peak memory.")
+    ap.add_argument("suite", choices=["micro", "rerun", "startup", "e2e", "load", "burst"])
+    ap.add_argument("--n", type=int, default=20000, help="random profiles for micro")
+    ap.add_argument("--exhaustive", action="store_true", help="micro over all 78,125 profiles")
+    ap.add_argument("--only", default="", help="micro benchmarks whose name contains this")
+    ap.add_argument("--rounds", type=int, default=None, help="radio clicks per rerun measurement (50) / fresh processes for startup (5)")
+    ap.add_argument("--app", default=None, help="script for rerun (default: app.py)")
+    ap.add_argument("--sessions", type=int, default=None, help="e2e / load sessions (40), burst concurrent sessions (8)")
+    ap.add_argument("--concurrency", type=int, default=4, help="concurrent e2e sessions")
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated Streamlit worker counts for load")
+    ap.add_argument("--url", default=None, help="load: send every session here (e.g. nginx) instead of the worker ports")
+    ap.add_argument("--rps", type=float, default=0.0, help="load: global OpenAI rate limit for the workers")
+    ap.add_argument("--ai", action="store_true", help="e2e / load against the stub OpenAI server")
+    ap.add_argument("--no-stream", action="store_true")
+    ap.add_argument("--latency", type=float, default=None, help="stub seconds per completion (0.4, burst: 3.0)")
+    ap.add_argument("--budget", type=float, default=4.0, help="burst: AI latency budget in seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--save", nargs="?", const="", default=None, metavar="PATH")
+    ap.add_argument("--compare", nargs="?", const="", default=None, metavar="PATH")
+    ap.add_argument("--tolerance", type=float, default=0.10)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+    if args.suite != "burst":
+        args.sessions = args.sessions or 40
+        args.latency = 0.4 if args.latency is None else args.latency
+
+    if args.suite == "micro":
+        from bench import micro
+
+        name = "micro"
+        results = micro.run(args.n, args.exhaustive, args.seed, args.only)
+        meta = {"profiles": 78125 if args.exhaustive else args.n, "seed": args.seed}
+    elif args.suite == "rerun":
+        from bench import e2e
+
+        name = "rerun"
+        rounds = args.rounds or 50
+        results = e2e.run_interactions(rounds, os.path.abspath(args.app) if args.app else e2e.APP_PATH, args.seed)
+        meta = {"rounds": rounds}
+    elif args.suite == "startup":
+        from bench import startup
+
+        name = "startup"
+        rounds = args.rounds or 5
+        results = startup.run(rounds, os.path.abspath(args.app) if args.app else startup.APP_PATH)
+        meta = {"rounds": rounds}
+    elif args.suite == "burst":
+        from bench import burst
+
+        name = "burst"
+        sessions, latency = args.sessions or 8, 3.0 if args.latency is None else args.latency
+        results = burst.run(sessions, latency, args.budget, not args.no_stream, args.seed)
+        meta = {"sessions": sessions, "latency": latency, "budget": args.budget}
+    elif args.suite == "load":
+        from bench import load
+
+        name = "load"
+        workers = [int(w) for w in args.workers.split(",")]
+        results = load.run(
+            workers, args.sessions, args.concurrency, args.ai, args.latency, args.rps, url=args.url, seed=args.seed
+        )
+        meta = {"workers": workers, "sessions": args.sessions, "concurrency": args.concurrency, "cpus": os.cpu_count()}
+    else:
+        from bench import e2e
+
+        name = "e2e-" + ("ai" + ("" if args.no_stream else "-stream") if args.ai else "local")
+        results = e2e.run(
+            args.sessions, args.concurrency, args.ai, not args.no_stream,
+            args.latency, args.error_rate, args.rate_429, args.seed,
+        )
+        meta = {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "stub": {"latency": args.latency, "error_rate": args.error_rate, "rate_429": args.rate_429} if args.ai else None,
+        }
+
+    rep = stats.report(name, results, **meta)
+    stats.print_table(rep)
+    for r in results:
+        extra = {k: v for k, v in r.items() if k in ("ai_share", "stub", "worker_max_rss_kb", "scaling", "errors", "openai_rps", "top_imports_ms")}
+        if extra:
+            print(f"  {r['name']}: {extra}")
+
+    regressed = []
+    if args.compare is not None:
+        path = args.compare or stats.baseline_path(name)
+        if os.path.exists(path):
+            regressed = stats.compare(rep, stats.load(path), args.tolerance)
+        else:
+            print(f"no baseline at {path}")
+    if args.save is not None:
+        path = args.save or stats.baseline_path(name)
+        cpus = os.cpu_count() or 1
+        if name == "load" and max(meta["workers"]) > cpus:
+            # workers beyond the core count share CPUs, so the report cannot show scaling
+            print(f"not saving {path}: {max(meta['workers'])} workers on {cpus} CPU(s), measure on a host with at least as many cores")
+        else:
+            stats.save(rep, path)
+            print(f"saved {path}")
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Cold-start benchmark: what a fresh server process costs before the first visitor sees the questionnaire.
+
+- imports: `python -X importtime` over the app script's first run, counting
+  only modules imported after streamlit itself (a running server has
+  streamlit loaded already), with the most expensive top-level imports;
+- first render: a fresh `streamlit run` worker per round (serve.py); one
+  websocket session connects and times the first question on screen and
+  the end of the first script run, then a second session on the now warm
+  process does the same.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from bench.stats import summarize
+
+MARK = "--startup-mark--"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+
+def import_profile(app_path: str) -> Tuple[float, Dict[str, float]]:
+    """(seconds of imports the app's first run adds, {top-level module: cumulative seconds})."""
+    code = (
+        "import runpy, sys, streamlit, streamlit.testing.v1\n"
+        f"sys.stderr.write({MARK!r} + '\\n'); sys.stderr.flush()\n"
+        f"runpy.run_path({app_path!r}, run_name='__main__')\n"
+    )
+    env = dict(os.environ, OPENAI_API_KEY="")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    lines = proc.stderr.split(MARK, 1)[1].splitlines()
+    total, top = 0, {}
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line.split(":", 1)[1].split("|")
+        total += int(self_us)
+        if not name.startswith("  "):
+            top[name.strip()] = int(cum_us) / 1e6
+    return total / 1e6, top
+
+
+async def _first_render(url: str) -> Tuple[float, float]:
+    import websockets
+
+    from bench.load import Session
+
+    t0 = time.perf_counter()
+    async with websockets.connect(f"{url}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as ws:
+        s = Session(ws)
+        await s.run()
+        return s.first_radio_at - t0, time.perf_counter() - t0
+
+
+def run(rounds: int = 5, app_path: str = APP_PATH, port: int = 8651) -> List[dict]:
+    import serve
+
+    imports, tops = [], []
+    for _ in range(rounds):
+        total, top = import_profile(app_path)
+        imports.append(total)
+        tops.append(top)
+
+    cold_q, cold_done, warm_q, warm_done = [], [], [], []
+    for _ in range(rounds):
+        procs = serve.start_workers(1, port, app_path, quiet=True)
+        try:
+            serve.wait_healthy([port])
+            for q, done in (cold_q, cold_done), (warm_q, warm_done):
+                tq, td = asyncio.run(_first_render(f"ws://127.0.0.1:{port}"))
+                q.append(tq)
+                done.append(td)
+        finally:
+            serve.stop(procs)
+
+    out = [summarize("startup: app imports", imports, sum(imports))]
+    slowest = sorted(tops[-1].items(), key=lambda kv: -kv[1])[:6]
+    out[0]["top_imports_ms"] = {k: round(v * 1000, 1) for k, v in slowest}
+    for name, lat in [
+        ("first render (cold process): questionnaire", cold_q),
+        ("first render (cold process): script done", cold_done),
+        ("first render (warm process): questionnaire", warm_q),
+        ("first render (warm process): script done", warm_done),
+    ]:
+        out.append(summarize(name, lat, sum(lat)))
+    return out
@@ -0,0 +1,118 @@
+"""Timing, percentile, memory and baseline-file helpers shared by the benchmarks."""
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# calls traced for peak memory; tracemalloc slows every allocation, so it never overlaps the timed pass
+MEMORY_SAMPLE = 1000
+
+
+def summarize(name: str, latencies_s: Sequence[float], wall_s: float, peak_kb: Optional[float] = None) -> dict:
+    lat = np.asarray(latencies_s, dtype=np.float64) * 1e6
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (0.0, 0.0, 0.0)
+    return {
+        "name": name,
+        "n": int(len(lat)),
+        "throughput_per_s": round(len(lat) / wall_s, 1) if wall_s > 0 else 0.0,
+        "mean_us": round(float(lat.mean()), 2) if len(lat) else 0.0,
+        "p50_us": round(float(p50), 2),
+        "p95_us": round(float(p95), 2),
+        "p99_us": round(float(p99), 2),
+        "peak_kb": None if peak_kb is None else round(peak_kb, 1),
+    }
+
+
+def measure(name: str, fn: Callable, inputs: Sequence, warmup: int = 100) -> dict:
+    """Call fn(*args) for every args tuple in inputs, timing each call; then trace memory on a sample."""
+    for args in inputs[:warmup]:
+        fn(*args)
+
+    clock = time.perf_counter
+    lat: List[float] = []
+    t0 = clock()
+    for args in inputs:
+        t = clock()
+        fn(*args)
+        lat.append(clock() - t)
+    wall = clock() - t0
+
+    tracemalloc.start()
+    for args in inputs[:MEMORY_SAMPLE]:
+        fn(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return summarize(name, lat, wall, peak)
+
+
+def max_rss_kb() -> int:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def report(suite: str, results: Iterable[dict], **meta) -> dict:
+    return {
+        "suite": suite,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "max_rss_kb": max_rss_kb(),
+        **meta,
+        "results": {r["name"]: r for r in results},
+    }
+
+
+def print_table(rep: dict) -> None:
+    print(f"[{rep['suite']}] python {rep['python']}, max RSS {rep['max_rss_kb'] / 1024:.1f} MiB")
+    print(f"{'benchmark':34s} {'n':>7s} {'ops/s':>10s} {'p50 us':>10s} {'p95 us':>10s} {'p99 us':>10s} {'peak KiB':>9s}")
+    for r in rep["results"].values():
+        peak = "-" if r.get("peak_kb") is None else f"{r['peak_kb']:.0f}"
+        print(
+            f"{r['name']:34s} {r['n']:7d} {r['throughput_per_s']:10.1f} "
+            f"{r['p50_us']:10.1f} {r['p95_us']:10.1f} {r['p99_us']:10.1f} {peak:>9s}"
+        )
+
+
+def baseline_path(suite: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{suite}.json")
+
+
+def save(rep: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(rep: dict, base: dict, tolerance: float = 0.10) -> List[str]:
+    """Print p50 / p99 / throughput changes against a baseline; names of benchmarks that regressed."""
+    regressed = []
+    print(f"vs baseline from {base.get('created', '?')} (tolerance {tolerance:.0%})")
+    for name, r in rep["results"].items():
+        b: Dict = base.get("results", {}).get(name)
+        if not b:
+            print(f"  {name:34s} (new)")
+            continue
+        ratio = lambda k: r[k] / b[k] if b.get(k) else 1.0
+        slower = ratio("p50_us") > 1 + tolerance or ratio("throughput_per_s") < 1 - tolerance
+        if slower:
+            regressed.append(name)
+        print(
+            f"  {name:34s} p50 x{ratio('p50_us'):5.2f}  p99 x{ratio('p99_us'):5.2f}  "
+            f"ops/s x{ratio('throughput_per_s'):5.2f}{'  REGRESSION' if slower else ''}"
+        )
+    return regressed
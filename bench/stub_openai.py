@@ -0,0 +1,197 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions like the real API, both plain JSON and
+SSE streaming, with configurable latency, 5xx error rate and 429 rate
+(with Retry-After). Replies carry an estimated token usage (also as the
+final stream chunk when stream_options.include_usage is set), including
+cached prompt tokens the way OpenAI's prompt caching reports them. Point the app or any CLI at it with
+OPENAI_BASE_URL=http://127.0.0.1:PORT/v1 and any API key.
+
+    python -m bench.stub_openai [--port 8765] [--latency 0.4] [--jitter 0.2] [--error-rate 0.02] [--rate-429 0.05]
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from core import GENRES
+
+# real Korean-market titles, so the cleaned output looks like a normal reply
+BOOKS: Dict[str, List[tuple]] = {
+    "자기계발": [("아주 작은 습관의 힘", "제임스 클리어"), ("그릿", "앤절라 더크워스"), ("몰입", "황농문")],
+    "인문/철학": [("정의란 무엇인가", "마이클 샌델"), ("죽음의 수용소에서", "빅터 프랭클"), ("미움받을 용기", "기시미 이치로")],
+    "과학/IT": [("코스모스", "칼 세이건"), ("이기적 유전자", "리처드 도킨스"), ("물고기는 존재하지 않는다", "룰루 밀러")],
+    "역사/사회": [("사피엔스", "유발 하라리"), ("총, 균, 쇠", "재레드 다이아몬드"), ("팩트풀니스", "한스 로슬링")],
+    "소설": [("데미안", "헤르만 헤세"), ("불편한 편의점", "김호연"), ("아몬드", "손원평")],
+}
+
+
+class StubOpenAI:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.4,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 0.2,
+        seed: Optional[int] = None,
+    ):
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.rate_429, self.retry_after = error_rate, rate_429, retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "stream": 0, "error_5xx": 0, "error_429": 0}
+        self._prefixes: set = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self) -> "StubOpenAI":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] += 1
+
+    def _roll(self) -> tuple:
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            r = self.rng.random()
+        if r < self.rate_429:
+            return "429", delay
+        if r < self.rate_429 + self.error_rate:
+            return "5xx", delay
+        return "ok", delay
+
+    @staticmethod
+    def content(payload: dict) -> str:
+        """Three books that depend on the prompt, so different profiles get different answers."""
+        prompt = json.dumps(payload.get("messages", []), ensure_ascii=False)
+        h = int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:4], "big")
+        picks = []
+        for i in range(3):
+            g = GENRES[(h >> (4 * i)) % len(GENRES)]
+            title, author = BOOKS[g][(h >> (4 * i + 12)) % len(BOOKS[g])]
+            picks.append({"title": title, "author": author, "genre": g})
+        return json.dumps({"recommendations": picks}, ensure_ascii=False)
+
+    def usage(self, payload: dict, content: str) -> dict:
+        """Rough usage: one token per 3 UTF-8 bytes (about one per Hangul syllable).
+
+        Like OpenAI, a prompt of 1024+ tokens whose system prefix was seen
+        before reports that prefix as cached, in 128-token steps.
+        """
+        tokens = lambda text: len(text.encode("utf-8")) // 3 + 4
+        messages = payload.get("messages", [])
+        prompt = sum(tokens(m.get("content", "")) for m in messages)
+        system = [m.get("content", "") for m in messages if m.get("role") == "system"]
+        key = hashlib.sha1(json.dumps([system, payload.get("response_format")], ensure_ascii=False).encode("utf-8")).digest()
+        with self.lock:
+            seen = key in self._prefixes
+            self._prefixes.add(key)
+        cached = sum(map(tokens, system)) // 128 * 128 if seen and prompt >= 1024 else 0
+        completion = tokens(content)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, headers: Optional[dict] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub._count("requests")
+                outcome, delay = stub._roll()
+                if outcome == "429":
+                    stub._count("error_429")
+                    return self._send(429, b'{"error":{"message":"rate limited"}}', {"Retry-After": str(stub.retry_after)})
+                if outcome == "5xx":
+                    time.sleep(delay / 2)
+                    stub._count("error_5xx")
+                    return self._send(503, b'{"error":{"message":"unavailable"}}')
+
+                content = stub.content(payload)
+                if not payload.get("stream"):
+                    time.sleep(delay)
+                    stub._count("ok")
+                    body = {
+                        "choices": [{"message": {"role": "assistant", "content": content}}],
+                        "usage": stub.usage(payload, content),
+                    }
+                    return self._send(200, json.dumps(body).encode("utf-8"))
+
+                stub._count("stream")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+                # first byte after a third of the latency, the rest spread over the remainder
+                time.sleep(delay / 3)
+                for p in pieces:
+                    chunk = {"choices": [{"delta": {"content": p}}]}
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                    time.sleep(delay * 2 / 3 / len(pieces))
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    chunk = {"choices": [], "usage": stub.usage(payload, content)}
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions endpoint.")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.4, help="seconds per completion")
+    ap.add_argument("--jitter", type=float, default=0.2, help="uniform +/- seconds on the latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    ap.add_argument("--retry-after", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    stub = StubOpenAI(args.port, args.latency, args.jitter, args.error_rate, args.rate_429, args.retry_after, args.seed)
+    print(f"stub OpenAI at {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Curated book catalog: the non-AI recommendation source.
+
+The data file (JSONL, CSV or SQLite, see load_rows) is loaded once per
+process into column arrays, with per-genre and per-(genre, situation tag)
+indexes holding row numbers and cumulative weights. Sampling k books is a
+handful of binary searches over those arrays, whatever the catalog size,
+and nothing is copied per request. The Catalog is read-only after build
+and shared by every session (get_catalog).
+
+Row fields: id, title, author, genre, tags (list, or "|"-separated in CSV),
+difficulty (1-3), year, available, weight.
+
+The column arrays can also be precompiled into an .npz next to the data
+file (python catalog.py compile); get_catalog loads that instead of
+parsing the rows whenever it is newer than its source.
+
+    python catalog.py compile [--path data/catalog.jsonl]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import GENRES, SITUATION_TAGS
+
+DEFAULT_PATH = os.environ.get(
+    "BOOK_CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalog.jsonl")
+)
+
+# rejection sampling gives up after this many draws per wanted book
+MAX_DRAWS_PER_BOOK = 16
+
+
+def is_available(value) -> bool:
+    """The available field as written in any format: 0/false/no/empty mean no, missing means yes."""
+    return value is None or str(value).strip().lower() not in ("0", "false", "no", "")
+
+
+def assign_ids(rows: Sequence[dict]) -> List[int]:
+    """Explicit ids as given (duplicates are an error), missing ones numbered on above the largest."""
+    ids: List[Optional[int]] = [None if r.get("id") in (None, "") else int(r["id"]) for r in rows]
+    explicit = [i for i in ids if i is not None]
+    if len(set(explicit)) < len(explicit):
+        dup = next(i for i in explicit if explicit.count(i) > 1)
+        raise ValueError(f"duplicate book id in catalog: {dup}")
+    next_id = max(explicit, default=0)
+    out = []
+    for i in ids:
+        if i is None:
+            next_id += 1
+            i = next_id
+        out.append(i)
+    return out
+
+
+def load_rows(path: str) -> List[dict]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if ext == ".csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        for r in rows:
+            r["tags"] = [t for t in (r.get("tags") or "").split("|") if t]
+        return rows
+    if ext in (".sqlite", ".sqlite3", ".db"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        rows = [dict(r) for r in conn.execute("SELECT * FROM books")]
+        conn.close()
+        for r in rows:
+            r["tags"] = [t for t in (r.get("tags") or "").split("|") if t]
+        return rows
+    raise ValueError(f"unsupported catalog format: {path}")
+
+
+# array columns stored in the compiled .npz, besides titles and authors
+COLUMNS = ("ids", "genre", "tag_mask", "difficulty", "year", "available", "weight")
+
+
+class Catalog:
+    def __init__(self, rows: Iterable[dict]):
+        rows = [r for r in rows if r.get("genre") in GENRES and str(r.get("title", "")).strip()]
+        self.ids = np.array(assign_ids(rows), dtype=np.int32)
+        self.titles: Tuple[str, ...] = tuple(str(r["title"]).strip() for r in rows)
+        self.authors: Tuple[str, ...] = tuple(str(r.get("author") or "").strip() for r in rows)
+        self.genre = np.array([GENRES.index(r["genre"]) for r in rows], dtype=np.uint8)
+        self.tag_mask = np.array(
+            [sum(1 << SITUATION_TAGS.index(t) for t in set(r.get("tags") or []) if t in SITUATION_TAGS) for r in rows],
+            dtype=np.uint8,
+        )
+        self.difficulty = np.array([int(r.get("difficulty") or 2) for r in rows], dtype=np.uint8)
+        self.year = np.array([int(r.get("year") or 0) for r in rows], dtype=np.int16)
+        self.available = np.array([is_available(r.get("available")) for r in rows], dtype=bool)
+        self.weight = np.array([float(r.get("weight") or 1.0) for r in rows], dtype=np.float64)
+        self._build_indexes()
+
+    @classmethod
+    def from_columns(cls, titles: Sequence[str], authors: Sequence[str], **columns: np.ndarray) -> "Catalog":
+        cat = cls.__new__(cls)
+        cat.titles, cat.authors = tuple(titles), tuple(authors)
+        for name in COLUMNS:
+            setattr(cat, name, columns[name])
+        cat._build_indexes()
+        return cat
+
+    def _build_indexes(self) -> None:
+        n = len(self.titles)
+        self.row_of_id = {int(i): k for k, i in enumerate(self.ids)}
+        self.row_of_title = {t: k for k, t in reversed(list(enumerate(self.titles)))}
+
+        live = self._live = self.available & (self.weight > 0)
+        self._by_genre: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._by_genre_tag: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        for gi, g in enumerate(GENRES):
+            in_genre = live & (self.genre == gi)
+            self._by_genre[g] = self._index(np.flatnonzero(in_genre))
+            for ti, t in enumerate(SITUATION_TAGS):
+                self._by_genre_tag[(g, t)] = self._index(np.flatnonzero(in_genre & (self.tag_mask >> ti & 1 == 1)))
+        self._merged_indexes: Dict[Tuple[frozenset, frozenset], Tuple[np.ndarray, np.ndarray]] = {}
+        self.size = n
+
+    def _index(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return rows.astype(np.int32), np.cumsum(self.weight[rows])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def count(self, genre: str, tag: Optional[str] = None) -> int:
+        idx = self._by_genre_tag.get((genre, tag)) if tag else self._by_genre.get(genre)
+        return 0 if idx is None else len(idx[0])
+
+    def sample(
+        self,
+        genres: Sequence[str],
+        k: int,
+        tags: Sequence[str] = (),
+        exclude: Optional[set] = None,
+        rng: Optional[random.Random] = None,
+    ) -> List[int]:
+        """Weighted sample of up to k distinct rows from the given genres.
+
+        Books carrying one of `tags` are tried first, the rest of each genre
+        fills up. Rows whose title is in `exclude` are skipped.
+        """
+        rng = rng or random
+        exclude = set(exclude or ())
+        out: List[int] = []
+        indexes = [self._merged(tuple(genres), tuple(tags))] if tags else []
+        indexes.append(self._merged(tuple(genres), ()))
+        for rows, cum in indexes:
+            if len(out) >= k or not len(rows):
+                continue
+            for _ in range(MAX_DRAWS_PER_BOOK * (k - len(out))):
+                i = int(rows[min(int(np.searchsorted(cum, rng.random() * cum[-1], side="right")), len(rows) - 1)])
+                if self.titles[i] in exclude:
+                    continue
+                exclude.add(self.titles[i])
+                out.append(i)
+                if len(out) >= k:
+                    break
+        return out
+
+    def _merged(self, genres: Tuple[str, ...], tags: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray]:
+        """Index over several genres, restricted to books with any of `tags` when given.
+
+        Built on first use and kept per (genre set, tag set), at most 2^5 * 2^4 of them.
+        """
+        key = (frozenset(g for g in genres if g in GENRES), frozenset(t for t in tags if t in SITUATION_TAGS))
+        idx = self._merged_indexes.get(key)
+        if idx is None:
+            mask = self._live & np.isin(self.genre, [GENRES.index(g) for g in key[0]])
+            if key[1]:
+                bits = sum(1 << SITUATION_TAGS.index(t) for t in key[1])
+                mask &= (self.tag_mask & bits) != 0
+            idx = self._merged_indexes[key] = self._index(np.flatnonzero(mask))
+        return idx
+
+    def book(self, i: int) -> dict:
+        return {"title": self.titles[i], "author": self.authors[i], "genre": GENRES[self.genre[i]]}
+
+
+def load_catalog(path: str = DEFAULT_PATH) -> Catalog:
+    return Catalog(load_rows(path))
+
+
+def compiled_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".npz"
+
+
+def compile_catalog(path: str = DEFAULT_PATH) -> str:
+    cat = load_catalog(path)
+    out = compiled_path(path)
+    tmp = f"{out}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp,
+        titles=np.array(cat.titles, dtype=str),
+        authors=np.array(cat.authors, dtype=str),
+        **{name: getattr(cat, name) for name in COLUMNS},
+    )
+    os.replace(tmp, out)
+    return out
+
+
+def load_compiled(path: str) -> Catalog:
+    with np.load(path, allow_pickle=False) as z:
+        return Catalog.from_columns(
+            [str(t) for t in z["titles"]], [str(a) for a in z["authors"]], **{name: z[name] for name in COLUMNS}
+        )
+
+
+@lru_cache(maxsize=None)
+def get_catalog(path: str = DEFAULT_PATH) -> Catalog:
+    compiled = compiled_path(path)
+    try:
+        if os.path.getmtime(compiled) >= os.path.getmtime(path):
+            return load_compiled(compiled)
+    except (OSError, ValueError, KeyError):
+        pass
+    return load_catalog(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Precompile the book catalog into column arrays.")
+    ap.add_argument("command", choices=["compile"])
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args(argv)
+
+    out = compile_catalog(args.path)
+    print(f"compiled {len(load_compiled(out))} books -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
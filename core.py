@@ -0,0 +1,115 @@
+"""Streamlit-free questionnaire data and scoring shared by the app and offline tools."""
+from typing import Dict, List
+
+# =====================================================
+# Questions
+# =====================================================
+questions = [
+    "1) 새로운 책을 고를 때 가장 끌리는 요소는?",
+    "2) 친구가 책 추천을 부탁하면 나는 보통…",
+    "3) 내가 책을 읽을 때 가장 만족스러운 순간은?",
+    "4) 평소 내가 가장 자주 관심을 갖는 주제는?",
+    "5) 요즘 나에게 가장 필요한 것은?",
+    "6) 최근 내가 책을 찾게 되는 이유는?",
+    "7) 지금 당장 책이 내게 해줬으면 하는 역할은?",
+]
+
+question_choices = [
+    ["A. 읽고 나서 바로 실천할 수 있는 조언","B. 삶에 대한 깊은 질문과 통찰","C. 새로운 지식과 기술을 배우는 재미","D. 사회와 시대를 이해하는 관점","E. 감정적으로 몰입할 수 있는 이야기"],
+    ["A. 도움이 될 만한 현실적인 책을 추천한다","B. 생각을 넓혀줄 책을 추천한다","C. 신기한 정보를 주는 책을 추천한다","D. 세상을 이해하게 해주는 책을 추천한다","E. 재미있게 읽히는 책을 추천한다"],
+    ["A. “이건 내 삶에 바로 적용할 수 있겠다” 느낄 때","B. “세상을 보는 시야가 넓어졌다” 느낄 때","C. “새로운 사실을 배웠다” 느낄 때","D. “사회나 역사를 이해하게 됐다” 느낄 때","E. “완전히 몰입해서 감정이 움직였다” 느낄 때"],
+    ["A. 성장, 목표, 자기관리","B. 인간관계, 삶의 의미","C. 미래기술, 과학, 데이터","D. 사회문제, 역사적 사건","E. 감정, 이야기, 상상 속 세계"],
+    ["A. 다시 동기부여하고 방향을 잡는 것","B. 내 마음을 정리할 수 있는 통찰","C. 머리를 자극하는 새로운 호기심","D. 현실을 이해하고 시야를 넓히는 관점","E. 위로받고 감정을 쉬게 하는 이야기"],
+    ["A. 미래 준비나 자기계발이 필요해서","B. 복잡한 감정을 정리하고 싶어서","C. 새로운 분야를 배우고 싶어서","D. 사회와 세상 흐름이 궁금해서","E. 지치고 쉬고 싶어서"],
+    ["A. “앞으로 뭘 해야 할지 알려주는 나침반”","B. “생각을 정리해주는 대화 상대”","C. “새로운 세상을 보여주는 창문”","D. “현실을 이해하게 해주는 지도”","E. “마음을 쉬게 해주는 휴식처”"],
+]
+
+# =====================================================
+# Mappings
+# =====================================================
+genre_map = {"A": "자기계발", "B": "인문/철학", "C": "과학/IT", "D": "역사/사회", "E": "소설"}
+
+genre_persona = {
+    "자기계발": "실행·루틴·성과를 중시하는 성장형",
+    "인문/철학": "의미·가치·자기이해를 깊게 파고드는 성찰형",
+    "과학/IT": "원리·구조·정보를 분석하는 탐구형",
+    "역사/사회": "사회 구조·맥락·흐름을 이해하려는 관찰형",
+    "소설": "감정·분위기·서사 몰입을 통해 회복하는 감성형",
+}
+
+genre_flavors = {
+    "자기계발": ["실행", "루틴", "동기부여", "습관", "자기관리"],
+    "인문/철학": ["성찰", "관점", "자기이해", "가치", "질문"],
+    "과학/IT": ["원리", "호기심", "미래", "문제해결", "구조"],
+    "역사/사회": ["맥락", "흐름", "구조", "사례", "시야"],
+    "소설": ["위로", "몰입", "여운", "관계", "회복"],
+}
+
+situation_tag_map_q5_to_q7 = {
+    5: {"A": ["동기"], "B": ["위로"], "C": ["탐구"], "D": ["탐구"], "E": ["위로", "휴식"]},
+    6: {"A": ["동기"], "B": ["위로"], "C": ["탐구"], "D": ["탐구"], "E": ["휴식", "위로"]},
+    7: {"A": ["동기"], "B": ["위로"], "C": ["탐구"], "D": ["탐구"], "E": ["휴식", "위로"]},
+}
+GENRES = list(genre_map.values())
+SITUATION_TAGS = ["위로", "휴식", "동기", "탐구"]
+
+tag_display = {"동기": "방향/동기부여", "위로": "감정 정리/위로", "휴식": "휴식/회복", "탐구": "호기심/탐구"}
+
+# =====================================================
+# Scoring
+# =====================================================
+def letter_of(ans: str) -> str:
+    return ans.strip()[0]
+
+def compute_genre_scores(answers: List[str]) -> Dict[str, int]:
+    scores = {g: 0 for g in genre_map.values()}
+    for a in answers:
+        scores[genre_map[letter_of(a)]] += 1
+    return scores
+
+def compute_situation_scores(answers: List[str]) -> Dict[str, int]:
+    tags = {t: 0 for t in SITUATION_TAGS}
+    for qno in [5, 6, 7]:
+        l = letter_of(answers[qno - 1])
+        for t in situation_tag_map_q5_to_q7[qno].get(l, []):
+            tags[t] += 1
+    return tags
+
+def ranked(scores: Dict[str, int]):
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+def top_keys(scores: Dict[str, int]):
+    r = ranked(scores)
+    maxv = r[0][1]
+    top = [k for k, v in r if v == maxv]
+    second = [k for k, v in r if v == (r[1][1] if len(r) > 1 else -1)]
+    return top, second, r
+
+def focus_genres_of(top_genres: List[str], second_genres: List[str]) -> List[str]:
+    return top_genres[:2] if len(top_genres) >= 2 else (top_genres + second_genres[:1])
+
+# =====================================================
+# Answer encoding (base-5 profile code)
+# =====================================================
+LETTERS = "ABCDE"
+NUM_QUESTIONS = len(questions)
+NUM_PROFILES = len(LETTERS) ** NUM_QUESTIONS
+
+def encode_letters(letters: str) -> int:
+    code = 0
+    for l in letters:
+        code = code * 5 + LETTERS.index(l)
+    return code
+
+def decode_letters(code: int) -> str:
+    out = []
+    for _ in range(NUM_QUESTIONS):
+        code, d = divmod(code, 5)
+        out.append(LETTERS[d])
+    return "".join(reversed(out))
+
+def encode_answers(answers: List[str]) -> int:
+    return encode_letters("".join(letter_of(a) for a in answers))
+
+def answers_of(letters: str) -> List[str]:
+    return [question_choices[i][LETTERS.index(l)] for i, l in enumerate(letters)]
@@ -0,0 +1,425 @@
+"""Append-only log of completed recommendations, compaction and offline reports.
+
+Every submitted result (session_result.CompactResult) becomes one JSON line:
+answer letters, the 9 genre / situation scores, the three books (catalog id
+or [title, author, genre]), ai_books (used_ai is ai_books > 0), path,
+ai_error and latency_ms. log() only puts the result on a queue; a
+background thread serializes and appends them in batches, so the script
+run never waits for the disk. A full queue drops events (counted) rather
+than blocking. Each process appends to its own segment files
+(events-<host>-<pid>-<start>.jsonl, rotated at SEGMENT_BYTES), so the
+workers of serve.py can share one directory.
+
+compact() turns the lines appended since the last run into NumPy column
+chunks (compacted/chunk-N.npz: codes, scores, book ids, small integer
+codes for path / ai_error) and remembers per-segment byte offsets in
+compacted/manifest.json; paths, errors and non-catalog books are
+vocabularies in the manifest, so chunks concatenate without remapping and
+are merged into one when there are more than MAX_CHUNKS. The reports run
+on the loaded columns (bincount, percentiles), not on the JSON.
+
+    python event_log.py compact [--dir events]
+    python event_log.py profiles [--top 20] [--days 7] [--out top_profiles.txt]
+    python event_log.py latency [--days 7]
+    python rec_cache.py prewarm --profiles top_profiles.txt
+
+Configured by EVENT_LOG_DIR (default: events/ next to this module).
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from core import NUM_PROFILES, decode_letters, encode_letters
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.environ.get("EVENT_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "events"))
+SEGMENT_BYTES = 64 << 20
+BATCH_SIZE = 512
+FLUSH_INTERVAL_S = 1.0
+MAX_QUEUE = 100_000
+MAX_CHUNKS = 16
+# book slot without a book (a result with fewer than three)
+NO_BOOK = -(2**31)
+
+COLUMNS = ("ts", "code", "scores", "books", "ai_books", "path", "ai_error", "latency_ms")
+
+
+# =====================================================
+# Writer
+# =====================================================
+def event_record(r, ts: float) -> dict:
+    return {
+        "ts": round(ts, 3),
+        "answers": decode_letters(r.code),
+        "scores": list(r.scores),
+        "books": list(r.books),
+        "ai_books": r.ai_books,
+        "path": r.path,
+        "ai_error": r.ai_error,
+        "latency_ms": r.latency_ms,
+    }
+
+
+class EventLog:
+    def __init__(self, directory: str = DEFAULT_DIR, batch_size: int = BATCH_SIZE, flush_interval_s: float = FLUSH_INTERVAL_S):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.counters: Counter = Counter()
+        self._queue: "queue.Queue" = queue.Queue(MAX_QUEUE)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._prefix = f"events-{socket.gethostname()}-{os.getpid()}-{int(time.time())}"
+        self._segment = 0
+
+    def log(self, result) -> None:
+        """Queue a CompactResult for writing; never blocks."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), result))
+            self.counters["queued"] += 1
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [] if item is None else [item]
+            deadline = time.monotonic() + self.flush_interval_s
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            if item is None:
+                return
+
+    def _write(self, batch: list) -> None:
+        data = "".join(json.dumps(event_record(r, ts), ensure_ascii=False) + "\n" for ts, r in batch)
+        try:
+            if self._file is None or self._file.tell() >= SEGMENT_BYTES:
+                if self._file is not None:
+                    self._file.close()
+                self._segment += 1
+                path = os.path.join(self.directory, f"{self._prefix}-{self._segment:04d}.jsonl")
+                self._file = open(path, "a", encoding="utf-8")
+            self._file.write(data)
+            self._file.flush()
+        except OSError as e:
+            log.warning("event log write failed: %s", e)
+            self.counters["write_errors"] += 1
+            return
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# =====================================================
+# Compaction: JSON lines -> NumPy column chunks
+# =====================================================
+def _compacted_dir(directory: str) -> str:
+    return os.path.join(directory, "compacted")
+
+
+def _new_manifest() -> dict:
+    return {"offsets": {}, "chunks": [], "next_chunk": 0, "paths": [], "errors": [""], "books": []}
+
+
+def read_manifest(directory: str) -> dict:
+    path = os.path.join(_compacted_dir(directory), "manifest.json")
+    if not os.path.exists(path):
+        return _new_manifest()
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(directory: str, manifest: dict) -> None:
+    path = os.path.join(_compacted_dir(directory), "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _save_chunk(directory: str, manifest: dict, columns: Dict[str, "np.ndarray"]) -> None:
+    import numpy as np
+
+    name = f"chunk-{manifest['next_chunk']:06d}.npz"
+    path = os.path.join(_compacted_dir(directory), name)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **columns)
+    os.replace(path + ".tmp", path)
+    manifest["chunks"].append(name)
+    manifest["next_chunk"] += 1
+
+
+class _Memo(dict):
+    """dict that fills a missing key with fn(key)."""
+
+    def __init__(self, fn, items=()):
+        super().__init__(items)
+        self.fn = fn
+
+    def __missing__(self, key):
+        value = self[key] = self.fn(key)
+        return value
+
+
+def _vocab(values: list, key=lambda v: v, store=lambda v: v) -> _Memo:
+    """value -> index into a manifest list; unseen values are appended to it."""
+
+    def add(value) -> int:
+        values.append(store(value))
+        return len(values) - 1
+
+    return _Memo(add, ((key(v), i) for i, v in enumerate(values)))
+
+
+def _vocabs(manifest: dict) -> Dict[str, _Memo]:
+    return {
+        "paths": _vocab(manifest["paths"]),
+        "errors": _vocab(manifest["errors"]),
+        "books": _vocab(manifest["books"], tuple, list),
+        "codes": _Memo(encode_letters),
+    }
+
+
+def _parse(data: bytes, name: str) -> List[dict]:
+    # one json.loads over the whole block instead of one per line
+    lines = data.splitlines()
+    try:
+        return json.loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                log.warning("skipping a bad line in %s", name)
+        return records
+
+
+def _columns(records: List[dict], vocabs: Dict[str, _Memo]) -> Dict[str, "np.ndarray"]:
+    import numpy as np
+
+    paths, errors, books, codes = vocabs["paths"], vocabs["errors"], vocabs["books"], vocabs["codes"]
+
+    def book_ids(refs: list) -> List[int]:
+        return [
+            NO_BOOK if b is None else b if b.__class__ is int else -1 - books[tuple(b)]
+            for b in (refs + [None, None, None])[:3]
+        ]
+
+    n = len(records)
+    return {
+        "ts": np.fromiter((e["ts"] for e in records), np.float64, n),
+        "code": np.fromiter((codes[e["answers"]] for e in records), np.uint32, n),
+        "scores": np.array([e["scores"] for e in records], np.uint8).reshape(n, 9),
+        "books": np.array([book_ids(e["books"]) for e in records], np.int32).reshape(n, 3),
+        "ai_books": np.fromiter((e["ai_books"] for e in records), np.uint8, n),
+        "path": np.fromiter((paths[e["path"]] for e in records), np.uint8, n),
+        "ai_error": np.fromiter((errors[e["ai_error"]] for e in records), np.uint16, n),
+        "latency_ms": np.fromiter((-1 if e["latency_ms"] is None else e["latency_ms"] for e in records), np.int32, n),
+    }
+
+
+def compact(directory: str = DEFAULT_DIR) -> int:
+    """Move complete lines appended since the last run into a new chunk; returns how many."""
+    import numpy as np
+
+    os.makedirs(_compacted_dir(directory), exist_ok=True)
+    manifest = read_manifest(directory)
+    vocabs = _vocabs(manifest)
+    parts = []
+    offsets = dict(manifest["offsets"])
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            f.seek(offsets.get(name, 0))
+            data = f.read()
+        # a writer may be in the middle of a line; it is picked up next time
+        end = data.rfind(b"\n") + 1
+        if not end:
+            continue
+        parts.append(_columns(_parse(data[:end], name), vocabs))
+        offsets[name] = offsets.get(name, 0) + end
+    added = sum(int(p["code"].size) for p in parts)
+    if added:
+        _save_chunk(directory, manifest, {k: np.concatenate([p[k] for p in parts]) for k in COLUMNS})
+    manifest["offsets"] = offsets
+    if len(manifest["chunks"]) > MAX_CHUNKS:
+        _merge_chunks(directory, manifest)
+    _write_manifest(directory, manifest)
+    return added
+
+
+def _merge_chunks(directory: str, manifest: dict) -> None:
+    old = list(manifest["chunks"])
+    columns = _load_columns(directory, old)
+    manifest["chunks"] = []
+    _save_chunk(directory, manifest, columns)
+    # the manifest is written after the merged chunk exists; removing the old ones last
+    # means a crash in between leaves unreferenced files, never lost events
+    _write_manifest(directory, manifest)
+    for name in old:
+        os.remove(os.path.join(_compacted_dir(directory), name))
+
+
+def _load_columns(directory: str, chunks: List[str]) -> Dict[str, "np.ndarray"]:
+    import numpy as np
+
+    parts = []
+    for name in chunks:
+        with np.load(os.path.join(_compacted_dir(directory), name)) as z:
+            parts.append({k: z[k] for k in COLUMNS})
+    if not parts:
+        return _columns([], _vocabs(_new_manifest()))
+    return {k: np.concatenate([p[k] for p in parts]) for k in COLUMNS}
+
+
+# =====================================================
+# Reports
+# =====================================================
+class Events(NamedTuple):
+    columns: Dict[str, "np.ndarray"]
+    paths: List[str]
+    errors: List[str]
+
+    @property
+    def n(self) -> int:
+        return int(self.columns["code"].size)
+
+    def since(self, days: Optional[float]) -> "Events":
+        if not days:
+            return self
+        mask = self.columns["ts"] >= time.time() - days * 86400
+        return self._replace(columns={k: v[mask] for k, v in self.columns.items()})
+
+    def ai_attempted(self) -> "np.ndarray":
+        """Events where the AI path ran: AI books, an AI error or a non-local path."""
+        c = self.columns
+        local = self.paths.index("local") if "local" in self.paths else -1
+        return (c["ai_books"] > 0) | (c["ai_error"] > 0) | (c["path"] != local)
+
+
+def load_events(directory: str = DEFAULT_DIR) -> Events:
+    manifest = read_manifest(directory)
+    return Events(_load_columns(directory, manifest["chunks"]), manifest["paths"], manifest["errors"])
+
+
+def profile_frequency(ev: Events, top: int = 20) -> List[dict]:
+    """Most frequent answer profiles with their AI share."""
+    import numpy as np
+
+    code = ev.columns["code"]
+    counts = np.bincount(code, minlength=NUM_PROFILES)
+    used_ai = np.bincount(code, weights=ev.columns["ai_books"] > 0, minlength=NUM_PROFILES)
+    order = np.argsort(counts, kind="stable")[::-1][:top]
+    total = max(ev.n, 1)
+    return [
+        {"answers": decode_letters(int(c)), "count": int(counts[c]), "share": counts[c] / total, "ai_share": used_ai[c] / counts[c]}
+        for c in order
+        if counts[c]
+    ]
+
+
+def latency_report(ev: Events) -> dict:
+    """Latency percentiles per path, and how often an AI attempt fell back to the local pick."""
+    import numpy as np
+
+    c = ev.columns
+    by_path = []
+    for i, path in enumerate(ev.paths):
+        lat = c["latency_ms"][(c["path"] == i) & (c["latency_ms"] >= 0)]
+        if lat.size:
+            p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+            by_path.append({"path": path, "n": int(lat.size), "p50": p50, "p90": p90, "p99": p99, "max": int(lat.max())})
+    attempted = ev.ai_attempted()
+    fallback = attempted & (c["ai_books"] < 3)
+    errors = np.bincount(c["ai_error"][fallback], minlength=len(ev.errors))
+    return {
+        "events": ev.n,
+        "profiles": int(np.unique(c["code"]).size),
+        "by_path": sorted(by_path, key=lambda r: -r["n"]),
+        "ai_attempted": int(attempted.sum()),
+        "ai_fallback": int(fallback.sum()),
+        "fallback_reasons": {ev.errors[i] or "(partial)": int(n) for i, n in sorted(enumerate(errors), key=lambda t: -t[1]) if n},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compact the recommendation event log and report on it.")
+    ap.add_argument("command", choices=["compact", "profiles", "latency"])
+    ap.add_argument("--dir", default=DEFAULT_DIR)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--days", type=float, default=None, help="only events from the last N days")
+    ap.add_argument("--out", help="profiles: write 'LETTERS count' lines, e.g. for rec_cache.py prewarm --profiles")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    added = compact(args.dir)
+    if args.command == "compact":
+        print(f"compacted {added} events in {time.perf_counter() - t0:.2f}s")
+        return 0
+    ev = load_events(args.dir).since(args.days)
+    if args.command == "profiles":
+        rows = profile_frequency(ev, args.top)
+        print(f"{ev.n} events")
+        for r in rows:
+            print(f"  {r['answers']}  {r['count']:8d}  {r['share']:6.2%}  ai {r['ai_share']:6.1%}")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.writelines(f"{r['answers']} {r['count']}\n" for r in rows)
+            print(f"wrote {args.out}")
+    else:
+        rep = latency_report(ev)
+        print(f"{rep['events']} events, {rep['profiles']} distinct profiles")
+        for r in rep["by_path"]:
+            print(f"  {r['path']:10s} {r['n']:8d}  p50 {r['p50']:7.0f}  p90 {r['p90']:7.0f}  p99 {r['p99']:7.0f}  max {r['max']:7d} ms")
+        share = rep["ai_fallback"] / rep["ai_attempted"] if rep["ai_attempted"] else 0.0
+        print(f"  AI attempted {rep['ai_attempted']}, fell back to the local pick {rep['ai_fallback']} ({share:.1%})")
+        for reason, n in rep["fallback_reasons"].items():
+            print(f"    {reason}: {n}")
+    print(f"({time.perf_counter() - t0:.2f}s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
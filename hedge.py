@@ -0,0 +1,75 @@
+"""Latency-budgeted race between AI recommendation feeds and the local fallback.
+
+The caller starts the primary AI request (a BookFeed, see prefetch.py) and
+computes the local pick_3_books result up front. race_ai_feeds waits for
+the first AI feed to produce a book, optionally launching a hedged duplicate
+request after hedge_delay, and gives up when the budget runs out; the local
+result is shown then and the still-running feeds can upgrade it later.
+"""
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from prefetch import BookFeed
+
+POLL_S = 0.01
+
+
+class RaceOutcome(NamedTuple):
+    winner: str  # "ai", "ai_hedge" or "local"
+    feed: Optional[BookFeed]  # winning AI feed, may still be streaming
+    pending: List[BookFeed]  # AI feeds still running after the budget ran out
+    elapsed: float
+
+
+def race_ai_feeds(
+    primary: BookFeed,
+    start_hedge: Optional[Callable[[], BookFeed]] = None,
+    budget_s: float = 2.5,
+    hedge_delay_s: float = 1.0,
+) -> RaceOutcome:
+    """Raise the first feed error if every AI feed fails before producing a book."""
+    t0 = time.perf_counter()
+    deadline = t0 + budget_s if budget_s > 0 else float("inf")
+    hedge_at = t0 + hedge_delay_s if start_hedge else None
+    feeds = [("ai", primary)]
+    errors = []
+
+    while True:
+        for name, f in feeds:
+            if f.books:
+                return RaceOutcome(name, f, [], time.perf_counter() - t0)
+
+        live = []
+        for name, f in feeds:
+            if f.done:
+                if f.error is not None:
+                    errors.append(f.error)
+            else:
+                live.append((name, f))
+        feeds = live
+
+        now = time.perf_counter()
+        # hedge after the delay, or right away once the primary has failed
+        if hedge_at is not None and (now >= hedge_at or not feeds):
+            feeds.append(("ai_hedge", start_hedge()))
+            hedge_at = None
+            continue
+        if not feeds:
+            if errors:
+                raise errors[0]
+            return RaceOutcome("local", None, [], now - t0)
+        if now >= deadline:
+            return RaceOutcome("local", None, [f for _, f in feeds], now - t0)
+        time.sleep(POLL_S)
+
+
+def first_complete(feeds: List[BookFeed], timeout_s: float, need: int = 3) -> Optional[BookFeed]:
+    """Wait for one of the pending feeds to finish with at least `need` books."""
+    deadline = time.perf_counter() + timeout_s
+    while feeds and time.perf_counter() < deadline:
+        for f in feeds:
+            if f.done and len(f.books) >= need:
+                return f
+        feeds = [f for f in feeds if not f.done]
+        time.sleep(POLL_S)
+    return None
@@ -0,0 +1,375 @@
+"""OpenAI recommendation path (prompt, request, cleaning) without Streamlit.
+
+Two prompt modes (OPENAI_PROMPT_MODE, or the prompt= argument):
+- "full" (default): the original prompt, a JSON example in the system message and all
+  seven answer sentences in the user message;
+- "compact": the user message is only focus_genres, top_situations
+  and the answer letters; a short letter legend lives in a system message
+  that is byte-identical for every call (a stable prefix for provider-side
+  prompt caching), the reply shape is enforced by a strict JSON schema and
+  the reply length is capped at COMPACT_MAX_TOKENS.
+
+Token usage of every call is logged and counted per mode (openai_tokens),
+so the two can be compared (recommender.py --ai --prompt) before the
+default changes.
+ai_pick_books_async is the same JSON path on AsyncOpenAIClient, for the
+batch CLI (recommender.py --ai).
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from core import LETTERS, genre_map, letter_of, situation_tag_map_q5_to_q7
+from metrics import metrics
+from openai_client import AsyncOpenAIClient, OpenAIError, chat_payload, get_client, parse_json_content
+from singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+PROMPT_MODE = os.environ.get("OPENAI_PROMPT_MODE", "full")
+# three books as {"title","author","genre"} JSON come to well under 200 tokens
+COMPACT_MAX_TOKENS = 300
+
+# =====================================================
+# Prompt
+# =====================================================
+PROMPT_RULES = (
+    "규칙:\n"
+    "- 반드시 실제로 존재하는 책\n"
+    "- genre는 지정된 5개 중 하나\n"
+    "- focus_genres를 우선 반영하되, 상황(top_situations)도 고려\n"
+    "- 대학생이 읽기 무난한 난이도 우선\n"
+    "- 시/만화/웹툰은 제외\n"
+)
+
+SYSTEM_PROMPT = (
+    "너는 한국의 독서 큐레이터다.\n"
+    "반드시 '한국어로 출간/유통되는 책(국내 도서 또는 한국어 번역서)'만 추천해라.\n"
+    "사용자의 설문(성향+상황)을 반영해 3권을 추천하되, 아래 JSON 형식만 출력해라.\n\n"
+    "{\n"
+    '  "recommendations": [\n'
+    '    {"title":"도서명", "author":"저자(모르면 빈 문자열)", "genre":"자기계발|인문/철학|과학/IT|역사/사회|소설"}\n'
+    "  ]\n"
+    "}\n\n"
+    + PROMPT_RULES
+)
+
+def build_user_prompt(answers: List[str], focus_genres: List[str], top_situations: List[str]) -> str:
+    return (
+        f"focus_genres: {focus_genres}\n"
+        f"top_situations: {top_situations}\n"
+        "사용자 답변:\n" + "\n".join([f"- {a}" for a in answers])
+    )
+
+def letter_legend() -> str:
+    """What an answer letter stands for: a genre for questions 1-4, situation tags for 5-7."""
+    genres = ", ".join(f"{l}={g}" for l, g in genre_map.items())
+    sits = ", ".join(
+        f"{l}={'/'.join(dict.fromkeys(t for q in (5, 6, 7) for t in situation_tag_map_q5_to_q7[q].get(l, [])))}"
+        for l in LETTERS
+    )
+    return f"answers는 7개 질문에 고른 보기 글자(A~E)다. 1~4번: {genres}. 5~7번(지금 필요한 것): {sits}.\n"
+
+COMPACT_SYSTEM_PROMPT = (
+    "너는 한국의 독서 큐레이터다.\n"
+    "반드시 '한국어로 출간/유통되는 책(국내 도서 또는 한국어 번역서)'만 추천해라.\n"
+    "사용자의 설문(성향+상황)을 반영해 3권을 추천해라.\n"
+    + letter_legend()
+    + PROMPT_RULES
+)
+
+def book_schema() -> dict:
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "author": {"type": "string"},
+            "genre": {"type": "string", "enum": list(genre_map.values())},
+        },
+        "required": ["title", "author", "genre"],
+        "additionalProperties": False,
+    }
+
+def recommendation_schema() -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "recommendations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"recommendations": {"type": "array", "items": book_schema()}},
+                "required": ["recommendations"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def build_compact_user_prompt(letters: str, focus_genres: List[str], top_situations: List[str]) -> str:
+    return json.dumps(
+        {"focus_genres": list(focus_genres), "top_situations": list(top_situations), "answers": letters},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+def build_payload(
+    prompt: str, model: str, answers: List[str], focus_genres: List[str], top_situations: List[str], letters: str
+) -> dict:
+    if prompt == "full":
+        return chat_payload(model, SYSTEM_PROMPT, build_user_prompt(answers, focus_genres, top_situations))
+    if prompt != "compact":
+        raise ValueError(f"unknown prompt mode: {prompt!r}")
+    return {
+        "model": model,
+        "temperature": 0.6,
+        "max_completion_tokens": COMPACT_MAX_TOKENS,
+        "response_format": recommendation_schema(),
+        "messages": [
+            {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+            {"role": "user", "content": build_compact_user_prompt(letters, focus_genres, top_situations)},
+        ],
+    }
+
+def record_usage(prompt: str, model: str, mode: str, usage: Optional[dict]) -> None:
+    """Log one call's token usage and add it to the openai_tokens counters."""
+    if not usage:
+        return
+    tokens = {
+        "prompt": usage.get("prompt_tokens") or 0,
+        "cached": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+        "completion": usage.get("completion_tokens") or 0,
+    }
+    log.info(
+        "openai usage prompt=%s mode=%s model=%s prompt_tokens=%d cached_tokens=%d completion_tokens=%d",
+        prompt, mode, model, tokens["prompt"], tokens["cached"], tokens["completion"],
+    )
+    for kind, n in tokens.items():
+        metrics.inc("openai_tokens", n, kind=kind, prompt=prompt)
+    metrics.inc("openai_calls", prompt=prompt)
+
+# =====================================================
+# Request (pooled client, see openai_client.py)
+# =====================================================
+def call_openai_json(api_key: str, payload: dict) -> Tuple[dict, dict]:
+    """(parsed JSON content, token usage) of one completion."""
+    body = get_client().chat_completion(api_key, payload)
+    return parse_json_content(body), body.get("usage") or {}
+
+async def call_openai_json_async(api_key: str, payload: dict) -> Tuple[dict, dict]:
+    body = await AsyncOpenAIClient().chat_completion(api_key, payload)
+    return parse_json_content(body), body.get("usage") or {}
+
+# =====================================================
+# Single-flight (one upstream call per identical profile in flight)
+# =====================================================
+flights = SingleFlight()
+
+def flight_key(model: str, focus_genres: List[str], top_situations: List[str], letters: str) -> tuple:
+    return (model, tuple(focus_genres), tuple(top_situations), letters)
+
+# =====================================================
+# Cleaning
+# =====================================================
+def clean_one(r: dict, focus_genres: List[str]) -> Optional[dict]:
+    title = str(r.get("title", "")).strip()
+    author = str(r.get("author", "")).strip()
+    genre = str(r.get("genre", "")).strip()
+    if genre not in genre_map.values():
+        genre = focus_genres[0] if focus_genres else "소설"
+    return {"title": title, "author": author, "genre": genre} if title else None
+
+def clean_recommendations(recs: list, focus_genres: List[str]) -> List[dict]:
+    cleaned = [c for c in (clean_one(r, focus_genres) for r in recs[:5] if isinstance(r, dict)) if c]
+
+    uniq, seen = [], set()
+    for c in cleaned:
+        if c["title"] in seen:
+            continue
+        seen.add(c["title"])
+        uniq.append(c)
+        if len(uniq) == 3:
+            break
+    return uniq
+
+def _fetch_books(api_key: str, model: str, answers: List[str], focus_genres: List[str], top_situations: List[str], letters: str, cache, prompt: str) -> List[dict]:
+    payload = build_payload(prompt, model, answers, focus_genres, top_situations, letters)
+    with metrics.span("openai", mode="json", prompt=prompt) as span:
+        try:
+            obj, usage = call_openai_json(api_key, payload)
+        except OpenAIError as e:
+            span["error"] = e.reason
+            raise
+    record_usage(prompt, model, "json", usage)
+    uniq = clean_recommendations(obj.get("recommendations", []), focus_genres)
+
+    if cache is not None and len(uniq) == 3:
+        cache.put_profile(model, focus_genres, top_situations, letters, uniq)
+    return uniq
+
+async def ai_pick_books_async(
+    api_key: str,
+    model: str,
+    answers: List[str],
+    focus_genres: List[str],
+    top_situations: List[str],
+    cache=None,
+    prompt: str = "",
+) -> List[dict]:
+    """ai_pick_books_korean_only on the event loop (AsyncOpenAIClient); no single-flight, cache calls on a thread."""
+    letters = "".join(letter_of(a) for a in answers)
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.get_profile, model, focus_genres, top_situations, letters)
+        if hit is not None:
+            return hit
+
+    prompt = prompt or PROMPT_MODE
+    payload = build_payload(prompt, model, answers, focus_genres, top_situations, letters)
+    with metrics.span("openai", mode="json", prompt=prompt) as span:
+        try:
+            obj, usage = await call_openai_json_async(api_key, payload)
+        except OpenAIError as e:
+            span["error"] = e.reason
+            raise
+    record_usage(prompt, model, "json", usage)
+    uniq = clean_recommendations(obj.get("recommendations", []), focus_genres)
+
+    if cache is not None and len(uniq) == 3:
+        await asyncio.to_thread(cache.put_profile, model, focus_genres, top_situations, letters, uniq)
+    return uniq
+
+def ai_pick_books_korean_only(
+    api_key: str,
+    model: str,
+    answers: List[str],
+    focus_genres: List[str],
+    top_situations: List[str],
+    cache=None,
+    coalesce: bool = True,
+    prompt: str = "",
+) -> List[dict]:
+    letters = "".join(letter_of(a) for a in answers)
+    if cache is not None:
+        hit = cache.get_profile(model, focus_genres, top_situations, letters)
+        if hit is not None:
+            return hit
+
+    args = (api_key, model, answers, focus_genres, top_situations, letters, cache, prompt or PROMPT_MODE)
+    if not coalesce:
+        return _fetch_books(*args)
+    return flights.do(flight_key(model, focus_genres, top_situations, letters), _fetch_books, *args)
+
+# =====================================================
+# Streaming
+# =====================================================
+class RecommendationStreamParser:
+    """Pull complete objects out of the "recommendations" array while the JSON is still arriving."""
+
+    _ARRAY_START = re.compile(r'"recommendations"\s*:\s*\[')
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = -1
+        self.depth = 0
+        self.start = 0
+        self.in_str = False
+        self.escaped = False
+        self.done = False
+
+    def feed(self, text: str) -> List[dict]:
+        self.buf += text
+        out = []
+        if self.pos < 0:
+            m = self._ARRAY_START.search(self.buf)
+            if not m:
+                return out
+            self.pos = m.end()
+
+        buf = self.buf
+        while self.pos < len(buf) and not self.done:
+            ch = buf[self.pos]
+            if self.in_str:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        out.append(json.loads(buf[self.start:self.pos + 1]))
+                    except ValueError:
+                        pass
+            elif ch == "]" and self.depth == 0:
+                self.done = True
+            self.pos += 1
+        return out
+
+def _stream_books(api_key: str, model: str, answers: List[str], focus_genres: List[str], top_situations: List[str], letters: str, cache, prompt: str) -> Iterator[dict]:
+    payload = build_payload(prompt, model, answers, focus_genres, top_situations, letters)
+    parser = RecommendationStreamParser()
+    raw_seen, uniq, seen = 0, [], set()
+    usage: dict = {}
+    done = False
+    t0 = time.perf_counter()
+    with metrics.span("openai", mode="stream", prompt=prompt) as span:
+        try:
+            for delta in get_client().stream_chat(api_key, payload, usage=usage):
+                # after the last book only the closing brackets and the usage chunk are left; read them
+                if done:
+                    continue
+                for r in parser.feed(delta):
+                    raw_seen += 1
+                    c = clean_one(r, focus_genres) if isinstance(r, dict) and raw_seen <= 5 else None
+                    if c is None or c["title"] in seen:
+                        continue
+                    seen.add(c["title"])
+                    uniq.append(c)
+                    if len(uniq) == 1:
+                        metrics.record("openai_first_book", time.perf_counter() - t0)
+                    yield c
+                    if len(uniq) == 3:
+                        break
+                done = len(uniq) == 3 or parser.done or raw_seen >= 5
+        except OpenAIError as e:
+            span["error"] = e.reason
+            raise
+    record_usage(prompt, model, "stream", usage)
+
+    if cache is not None and len(uniq) == 3:
+        cache.put_profile(model, focus_genres, top_situations, letters, uniq)
+
+def stream_books_korean_only(
+    api_key: str,
+    model: str,
+    answers: List[str],
+    focus_genres: List[str],
+    top_situations: List[str],
+    cache=None,
+    coalesce: bool = True,
+    prompt: str = "",
+) -> Iterator[dict]:
+    """Yield cleaned recommendations one at a time as the streamed reply completes each object."""
+    letters = "".join(letter_of(a) for a in answers)
+    if cache is not None:
+        hit = cache.get_profile(model, focus_genres, top_situations, letters)
+        if hit is not None:
+            yield from hit
+            return
+
+    args = (api_key, model, answers, focus_genres, top_situations, letters, cache, prompt or PROMPT_MODE)
+    if not coalesce:
+        yield from _stream_books(*args)
+        return
+    yield from flights.stream(flight_key(model, focus_genres, top_situations, letters), _stream_books, *args)
@@ -0,0 +1,163 @@
+"""In-process instrumentation for the recommendation flow.
+
+Stage timings go into a fixed-size ring buffer (a deque of tuples, so a
+span costs two perf_counter calls and one append); counters are a locked
+Counter keyed by (name, labels). Other components keep their own counters
+(OpenAI client status codes, cache hits, single-flight, prefetch) and are
+pulled in at export time through register().
+
+Exports: Prometheus text format (stage summaries with rolling quantiles
+plus all counters) and JSONL (one line per recorded span). Everything is
+per process, like the Streamlit caches. Recording is stdlib only; numpy
+is imported on the first read, so timing the first page load does not
+pull it in.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+PREFIX = "bookrec"
+DEFAULT_CAPACITY = 4096
+
+# ring entry: wall-clock time, stage, seconds, sorted label pairs
+SpanRecord = Tuple[float, str, float, Tuple[Tuple[str, str], ...]]
+
+
+def _labels(labels: Dict[str, object]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _prom_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.spans: "deque[SpanRecord]" = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+        # lifetime totals per stage, so Prometheus _count/_sum survive ring wrap-around
+        self._totals: Dict[str, List[float]] = {}
+        self._collectors: Dict[str, Tuple[str, Callable[[], Dict[str, int]]]] = {}
+        self._jsonl_since = 0.0
+
+    # ---- recording ----
+    def record(self, stage: str, seconds: float, **labels) -> None:
+        self.spans.append((time.time(), stage, seconds, _labels(labels)))
+        with self._lock:
+            t = self._totals.setdefault(stage, [0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[dict]:
+        """Time a block; labels can still be added to the yielded dict inside it."""
+        t0 = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.record(stage, time.perf_counter() - t0, **labels)
+
+    def inc(self, name: str, n: int = 1, **labels) -> None:
+        with self._lock:
+            self._counters[(name, _labels(labels))] += n
+
+    def register(self, name: str, fn: Callable[[], Dict[str, int]], label: str = "kind") -> None:
+        """Export fn()'s {label value: count} as counter <prefix>_<name>_total{label=...}."""
+        self._collectors[name] = (label, fn)
+
+    # ---- reading ----
+    def counters(self) -> Dict[str, Dict[Tuple[Tuple[str, str], ...], int]]:
+        out: Dict[str, Dict] = {}
+        with self._lock:
+            for (name, labels), v in self._counters.items():
+                out.setdefault(name, {})[labels] = v
+        for name, (label, fn) in list(self._collectors.items()):
+            try:
+                values = fn()
+            except Exception:
+                continue
+            out.setdefault(name, {}).update({((label, str(k)),): v for k, v in values.items()})
+        return out
+
+    def stage_latencies(self, window_s: Optional[float] = None) -> Dict[str, "np.ndarray"]:
+        import numpy as np
+
+        since = time.time() - window_s if window_s else 0.0
+        by_stage: Dict[str, List[float]] = {}
+        for ts, stage, seconds, _ in list(self.spans):
+            if ts >= since:
+                by_stage.setdefault(stage, []).append(seconds)
+        return {k: np.asarray(v) for k, v in by_stage.items()}
+
+    def percentiles(self, window_s: Optional[float] = None, qs=(50, 95, 99)) -> List[dict]:
+        """Per stage: count and latency percentiles (ms) over the ring, optionally the last window_s seconds."""
+        import numpy as np
+
+        rows = []
+        for stage, lat in self.stage_latencies(window_s).items():
+            p = np.percentile(lat * 1000, qs)
+            rows.append({"stage": stage, "n": len(lat), **{f"p{q}_ms": round(float(v), 1) for q, v in zip(qs, p)}})
+        return rows
+
+    # ---- export ----
+    def to_prometheus(self) -> str:
+        import numpy as np
+
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Recommendation flow stage latency (quantiles over the recent ring buffer).",
+            f"# TYPE {PREFIX}_stage_seconds summary",
+        ]
+        with self._lock:
+            totals = {k: tuple(v) for k, v in self._totals.items()}
+        lat = self.stage_latencies()
+        for stage, (count, total) in sorted(totals.items()):
+            if stage in lat:
+                for q, v in zip((0.5, 0.95, 0.99), np.percentile(lat[stage], [50, 95, 99])):
+                    lines.append(f"{PREFIX}_stage_seconds{_prom_labels([('stage', stage), ('quantile', str(q))])} {v:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{_prom_labels([('stage', stage)])} {total:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{_prom_labels([('stage', stage)])} {count}")
+
+        for name, series in sorted(self.counters().items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for labels, v in sorted(series.items()):
+                lines.append(f"{PREFIX}_{name}_total{_prom_labels(labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self, since: float = 0.0, until: float = float("inf")) -> str:
+        out = []
+        for ts, stage, seconds, labels in list(self.spans):
+            if since < ts <= until:
+                out.append(json.dumps({"ts": round(ts, 3), "stage": stage, "ms": round(seconds * 1000, 3), **dict(labels)}, ensure_ascii=False))
+        return "\n".join(out) + ("\n" if out else "")
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomic write, for node_exporter's textfile collector or a sidecar scraper."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def append_jsonl(self, path: str) -> int:
+        """Append the spans recorded since the previous call; returns how many were written."""
+        with self._lock:
+            since = self._jsonl_since
+            until = self._jsonl_since = time.time()
+        text = self.to_jsonl(since, until)
+        if text:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+        return text.count("\n")
+
+
+metrics = Metrics()
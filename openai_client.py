@@ -0,0 +1,236 @@
+"""Pooled, retrying HTTP client for the OpenAI chat completions endpoint.
+
+One client per server process is shared by every session (see get_client),
+so connections are kept alive across recommendations. The base URL comes
+from OPENAI_BASE_URL, which lets the whole path run against a local stub.
+With OPENAI_RATE_LIMIT_RPS set, every attempt first takes a token from the
+host-wide bucket in ratelimit.py, shared with the other app processes.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import TokenBucket, get_limiter
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenAIError(RuntimeError):
+    def __init__(self, reason: str, status: Optional[int] = None, detail: str = ""):
+        super().__init__(f"{reason}{f' ({status})' if status else ''}{f': {detail}' if detail else ''}")
+        self.reason = reason
+        self.status = status
+
+
+class OpenAIClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_concurrency: int = 8,
+        pool_size: int = 16,
+        limiter: Optional[TokenBucket] = None,
+    ):
+        self.base_url = (base_url or os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limit = threading.BoundedSemaphore(max_concurrency)
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    # ---- one attempt + retry policy (shared by the sync and async paths) ----
+    def _send_once(self, api_key: str, payload: dict, stream: bool = False) -> requests.Response:
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        # waiting for a token longer than a response could take is not worth it
+        if self.limiter is not None and not self.limiter.acquire(timeout=self.timeout[1]):
+            self._count("rate_limited")
+            raise OpenAIError("rate_limited", detail="local token bucket")
+        with self._limit:
+            self._count("requests")
+            return self.session.post(self.url, headers=headers, json=payload, timeout=self.timeout, stream=stream)
+
+    def _retry_delay(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _outcome(self, attempt: int, resp: Optional[requests.Response], exc: Optional[Exception]):
+        """Return (True, body) on success or (False, delay) when the attempt should be retried."""
+        if exc is not None:
+            reason = "timeout" if isinstance(exc, requests.Timeout) else "connection"
+            self._count(reason)
+            if attempt >= self.max_retries:
+                raise OpenAIError(reason, detail=str(exc)) from exc
+            return False, self._retry_delay(attempt, None)
+
+        self._count(f"http_{resp.status_code}")
+        if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+            delay = self._retry_delay(attempt, resp)
+            if resp.status_code == 429 and self.limiter is not None:
+                # hold back the other workers too, not just this retry loop
+                self.limiter.penalize(delay)
+            return False, delay
+        if resp.status_code >= 400:
+            raise OpenAIError(f"http_{resp.status_code}", status=resp.status_code, detail=resp.text[:200])
+        try:
+            return True, resp.json()
+        except ValueError as e:
+            raise OpenAIError("bad_json", status=resp.status_code) from e
+
+    def chat_completion(self, api_key: str, payload: dict) -> dict:
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            try:
+                resp = self._send_once(api_key, payload)
+            except requests.RequestException as e:
+                exc = e
+            done, value = self._outcome(attempt, resp, exc)
+            if done:
+                return value
+            self._count("retries")
+            time.sleep(value)
+            attempt += 1
+
+    def chat_json(self, api_key: str, model: str, system: str, user: str, temperature: float = 0.6) -> dict:
+        return parse_json_content(self.chat_completion(api_key, chat_payload(model, system, user, temperature)))
+
+    def stream_chat(self, api_key: str, payload: dict, usage: Optional[dict] = None) -> Iterator[str]:
+        """Yield content deltas of a streamed completion. Retries only happen before the first byte.
+
+        With a usage dict, the final usage chunk is requested and its counts are put into it.
+        """
+        payload = {**payload, "stream": True}
+        if usage is not None:
+            payload["stream_options"] = {"include_usage": True}
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            try:
+                resp = self._send_once(api_key, payload, stream=True)
+            except requests.RequestException as e:
+                exc = e
+            if resp is not None and resp.status_code < 400:
+                self._count(f"http_{resp.status_code}")
+                break
+            _, delay = self._outcome(attempt, resp, exc)
+            if resp is not None:
+                resp.close()
+            self._count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+        with resp:
+            try:
+                for line in resp.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        return
+                    chunk = json.loads(data)
+                    if usage is not None and chunk.get("usage"):
+                        usage.update(chunk["usage"])
+                    # the usage chunk comes with an empty choices list
+                    choices = chunk["choices"]
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        yield delta
+            except requests.RequestException as e:
+                self._count("stream_broken")
+                raise OpenAIError("stream_broken", detail=str(e)) from e
+            except (KeyError, IndexError, ValueError) as e:
+                raise OpenAIError("bad_json", detail=str(e)) from e
+
+
+class AsyncOpenAIClient:
+    """asyncio front end over a pooled OpenAIClient.
+
+    Requests run on worker threads through the same session and concurrency
+    limit; backoff waits use asyncio.sleep so the event loop stays free.
+    """
+
+    def __init__(self, client: Optional[OpenAIClient] = None):
+        self.client = client or get_client()
+
+    async def chat_completion(self, api_key: str, payload: dict) -> dict:
+        c = self.client
+        attempt = 0
+        while True:
+            resp, exc = None, None
+            try:
+                resp = await asyncio.to_thread(c._send_once, api_key, payload)
+            except requests.RequestException as e:
+                exc = e
+            done, value = c._outcome(attempt, resp, exc)
+            if done:
+                return value
+            c._count("retries")
+            await asyncio.sleep(value)
+            attempt += 1
+
+    async def chat_json(self, api_key: str, model: str, system: str, user: str, temperature: float = 0.6) -> dict:
+        body = await self.chat_completion(api_key, chat_payload(model, system, user, temperature))
+        return parse_json_content(body)
+
+
+def chat_payload(model: str, system: str, user: str, temperature: float = 0.6) -> dict:
+    return {
+        "model": model,
+        "temperature": temperature,
+        "response_format": {"type": "json_object"},
+        "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+    }
+
+
+def parse_json_content(body: dict) -> dict:
+    try:
+        return json.loads(body["choices"][0]["message"]["content"])
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise OpenAIError("bad_json", detail=str(e)) from e
+
+
+_client: Optional[OpenAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAIClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAIClient(limiter=get_limiter())
+        return _client
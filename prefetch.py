@@ -0,0 +1,179 @@
+"""Speculative background prefetch of AI recommendations.
+
+While the user is still answering, the partial answers often already fix
+the (focus_genres, top_situations) outcome: every way of filling in the
+remaining questions lands on the same pair. At that point the AI request
+can start in the background. Tasks are keyed on that pair, so sessions
+with the same pinned outcome share one request, and the "결과 보기" click
+reads the in-flight task's BookFeed (book by book, when streaming)
+instead of starting over.
+
+Only the speculative tasks share the small pool. Requests a user is
+waiting on (the click, a hedged duplicate) each get their own thread, so a
+burst of sessions never queues behind speculation or behind single-flight
+followers; the OpenAI client's max_concurrency still bounds the calls.
+
+A task lives only while it runs. A finished result is served again by the
+recommendation cache (rec_cache.py, with its TTL), a short answer (fewer
+than three books) is never handed to another session, and the session
+references end with the task, so abandoned sessions keep nothing alive.
+"""
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core import LETTERS, encode_letters
+
+# speculating with more open questions costs 5^n table reads and rarely pins anything
+MAX_OPEN_QUESTIONS = 3
+
+
+def pinned_outcome(table, partial: List[Optional[str]]) -> Optional[Tuple[List[str], List[str], str]]:
+    """(focus_genres, top_situations, representative letters) if every completion agrees, else None."""
+    open_idx = [i for i, l in enumerate(partial) if l is None]
+    if len(open_idx) > MAX_OPEN_QUESTIONS:
+        return None
+
+    outcome, first = None, None
+    letters = list(partial)
+    for fill in itertools.product(LETTERS, repeat=len(open_idx)):
+        for i, l in zip(open_idx, fill):
+            letters[i] = l
+        p = table.lookup(encode_letters(letters))
+        if outcome is None:
+            outcome, first = (p.focus_genres, p.top_situations), "".join(letters)
+        elif (p.focus_genres, p.top_situations) != outcome:
+            return None
+    return outcome[0], outcome[1], first
+
+
+class BookFeed:
+    """Books produced by a background request; readers iterate them as they arrive."""
+
+    def __init__(self):
+        self.books: List[dict] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self._cond = threading.Condition()
+
+    def push(self, b: dict) -> None:
+        with self._cond:
+            self.books.append(b)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def run(self, fn: Callable[..., Iterable[dict]], *args, **kwargs) -> List[dict]:
+        try:
+            for b in fn(*args, **kwargs):
+                self.push(b)
+        except BaseException as e:
+            self.finish(e)
+            raise
+        self.finish()
+        return self.books
+
+    def __iter__(self) -> Iterator[dict]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.books) and not self.done:
+                    self._cond.wait()
+                if i >= len(self.books):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                b = self.books[i]
+            yield b
+            i += 1
+
+
+class Prefetcher:
+    def __init__(self, max_workers: int = 4):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, Tuple[Future, BookFeed]] = {}
+        self._refs: Dict[str, int] = {}
+        self.stats = {"submitted": 0, "deduplicated": 0, "cancelled": 0, "reused": 0}
+
+    @staticmethod
+    def _usable(task: Tuple[Future, BookFeed]) -> bool:
+        """Still running, or finished with a full answer (until _forget drops it)."""
+        fut, feed = task
+        if fut.cancelled():
+            return False
+        return not fut.done() or (fut.exception() is None and len(feed.books) >= 3)
+
+    def acquire(self, key: str, fn: Callable[..., Iterable[dict]], *args, **kwargs) -> BookFeed:
+        """Start fn(*args, **kwargs) in the background unless a live task for key already exists."""
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and self._usable(task):
+                self._refs[key] = self._refs.get(key, 0) + 1
+                self.stats["deduplicated"] += 1
+                return task[1]
+            feed = BookFeed()
+            fut = self._pool.submit(feed.run, fn, *args, **kwargs)
+            self._tasks[key] = (fut, feed)
+            self._refs[key] = 1
+            self.stats["submitted"] += 1
+        fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+        return feed
+
+    def submit(self, fn: Callable[..., Iterable[dict]], *args, **kwargs) -> BookFeed:
+        """Run an unkeyed, unshared task right away on its own thread (the click, a hedged duplicate)."""
+        feed = BookFeed()
+
+        def run():
+            try:
+                feed.run(fn, *args, **kwargs)
+            except Exception:
+                pass  # kept on the feed for its reader
+
+        threading.Thread(target=run, name="ai-request", daemon=True).start()
+        with self._lock:
+            self.stats["submitted"] += 1
+        return feed
+
+    def release(self, key: str, feed: Optional[BookFeed]) -> None:
+        """Drop a session's interest in the task it acquired; the last one cancels it if it has not started."""
+        with self._lock:
+            task = self._tasks.get(key)
+            # finished (and forgotten) or replaced by a newer task for the same key
+            if task is None or task[1] is not feed:
+                return
+            n = self._refs.get(key, 0) - 1
+            if n > 0:
+                self._refs[key] = n
+                return
+            self._refs.pop(key, None)
+        # outside the lock: a successful cancel runs _forget right away
+        if task[0].cancel():
+            with self._lock:
+                self.stats["cancelled"] += 1
+
+    def take(self, key: str) -> Optional[BookFeed]:
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None or not self._usable(task):
+                return None
+        # still queued behind other speculation: the caller runs the request now instead
+        if task[0].cancel():
+            with self._lock:
+                self.stats["cancelled"] += 1
+            return None
+        with self._lock:
+            self.stats["reused"] += 1
+        return task[1]
+
+    def _forget(self, key: str, fut: Future) -> None:
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task[0] is fut:
+                self._tasks.pop(key, None)
+                self._refs.pop(key, None)
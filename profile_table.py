@@ -0,0 +1,168 @@
+"""Precomputed scoring table for every possible answer profile (5^7 = 78,125).
+
+Build / verify offline:
+    python profile_table.py build [--path profile_table.bin]
+    python profile_table.py verify [--path profile_table.bin]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+from core import (
+    GENRES,
+    NUM_PROFILES,
+    NUM_QUESTIONS,
+    SITUATION_TAGS,
+    answers_of,
+    compute_genre_scores,
+    compute_situation_scores,
+    decode_letters,
+    focus_genres_of,
+    genre_map,
+    situation_tag_map_q5_to_q7,
+    top_keys,
+)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_table.bin")
+
+# header: magic, version, record size, record count, scoring fingerprint
+MAGIC = b"BKPT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI8s")
+# record: 5 genre scores, 4 situation scores, top/second genre masks, top situation mask
+RECORD = struct.Struct("<5B4B3B")
+
+NG, NS = len(GENRES), len(SITUATION_TAGS)
+
+
+class Profile(NamedTuple):
+    code: int
+    genre_scores: Dict[str, int]
+    situation_scores: Dict[str, int]
+    top_genres: List[str]
+    second_genres: List[str]
+    top_situations: List[str]
+    focus_genres: List[str]
+
+
+def fingerprint() -> bytes:
+    src = json.dumps([genre_map, situation_tag_map_q5_to_q7, SITUATION_TAGS, NUM_QUESTIONS], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(src.encode("utf-8")).digest()[:8]
+
+
+def _mask(keys: List[str], order: List[str]) -> int:
+    return sum(1 << order.index(k) for k in keys)
+
+
+# mask -> names in insertion order; equal scores keep dict order in top_keys, so this is exact
+_GENRE_NAMES = [[g for i, g in enumerate(GENRES) if m >> i & 1] for m in range(1 << NG)]
+_TAG_NAMES = [[t for i, t in enumerate(SITUATION_TAGS) if m >> i & 1] for m in range(1 << NS)]
+
+
+def compute_profile(code: int) -> Profile:
+    answers = answers_of(decode_letters(code))
+    genre_scores = compute_genre_scores(answers)
+    top_genres, second_genres, _ = top_keys(genre_scores)
+    situation_scores = compute_situation_scores(answers)
+    top_situations, _, _ = top_keys(situation_scores)
+    return Profile(
+        code, genre_scores, situation_scores, top_genres, second_genres, top_situations,
+        focus_genres_of(top_genres, second_genres),
+    )
+
+
+def pack_profile(p: Profile) -> bytes:
+    return RECORD.pack(
+        *[p.genre_scores[g] for g in GENRES],
+        *[p.situation_scores[t] for t in SITUATION_TAGS],
+        _mask(p.top_genres, GENRES),
+        _mask(p.second_genres, GENRES),
+        _mask(p.top_situations, SITUATION_TAGS),
+    )
+
+
+def build_table(path: str = DEFAULT_PATH) -> str:
+    buf = bytearray(HEADER.pack(MAGIC, VERSION, RECORD.size, NUM_PROFILES, fingerprint()))
+    for code in range(NUM_PROFILES):
+        buf += pack_profile(compute_profile(code))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf)
+    os.replace(tmp, path)
+    return path
+
+
+class ProfileTable:
+    def __init__(self, path: str = DEFAULT_PATH):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rec_size, count, fp = HEADER.unpack_from(self._mm, 0)
+        if (magic, version, rec_size, count) != (MAGIC, VERSION, RECORD.size, NUM_PROFILES):
+            raise ValueError(f"{path}: not a compatible profile table")
+        if fp != fingerprint():
+            raise ValueError(f"{path}: built from different scoring rules, rebuild it")
+
+    def __len__(self) -> int:
+        return NUM_PROFILES
+
+    def lookup(self, code: int) -> Profile:
+        if not 0 <= code < NUM_PROFILES:
+            raise IndexError(code)
+        rec = RECORD.unpack_from(self._mm, HEADER.size + code * RECORD.size)
+        top_genres = _GENRE_NAMES[rec[NG + NS]]
+        second_genres = _GENRE_NAMES[rec[NG + NS + 1]]
+        return Profile(
+            code,
+            dict(zip(GENRES, rec[:NG])),
+            dict(zip(SITUATION_TAGS, rec[NG:NG + NS])),
+            list(top_genres),
+            list(second_genres),
+            list(_TAG_NAMES[rec[NG + NS + 2]]),
+            focus_genres_of(top_genres, second_genres),
+        )
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def load_or_build(path: str = DEFAULT_PATH) -> ProfileTable:
+    try:
+        return ProfileTable(path)
+    except (OSError, ValueError, struct.error):
+        build_table(path)
+        return ProfileTable(path)
+
+
+def verify_table(path: str = DEFAULT_PATH, limit: Optional[int] = None) -> List[int]:
+    table = ProfileTable(path)
+    bad = [code for code in range(NUM_PROFILES) if table.lookup(code) != compute_profile(code)]
+    table.close()
+    return bad[:limit] if limit else bad
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build or verify the answer-profile lookup table.")
+    ap.add_argument("command", choices=["build", "verify"])
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args(argv)
+
+    if args.command == "build":
+        build_table(args.path)
+        print(f"built {NUM_PROFILES} profiles -> {args.path} ({os.path.getsize(args.path)} bytes)")
+        return 0
+
+    bad = verify_table(args.path)
+    if bad:
+        print(f"{len(bad)} mismatched profiles, e.g. {[decode_letters(c) for c in bad[:5]]}")
+        return 1
+    print(f"ok: {NUM_PROFILES} profiles match the scoring functions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
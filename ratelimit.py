@@ -0,0 +1,157 @@
+"""Global token-bucket rate limit for OpenAI calls, shared by every app process on the host.
+
+The bucket state (tokens, last refill, blocked-until) is one row in a SQLite
+file in WAL mode; a refill-and-take is a single BEGIN IMMEDIATE transaction,
+so all Streamlit workers of a multi-process deployment (see serve.py) draw
+from the same budget without a sidecar or an external service. A 429 from
+the API pauses the whole bucket for the Retry-After time (penalize), so one
+worker's rate-limit answer slows every worker down.
+
+Configured from the environment (read by get_limiter):
+    OPENAI_RATE_LIMIT_RPS    sustained requests per second; unset or 0 disables the limiter
+    OPENAI_RATE_LIMIT_BURST  bucket size (default: one second of rate, at least 1)
+    RATE_LIMIT_PATH          SQLite file (default: ratelimit.sqlite3 next to this module)
+
+    python ratelimit.py stats
+    python ratelimit.py reset
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import List, Optional
+
+DEFAULT_PATH = os.environ.get(
+    "RATE_LIMIT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.sqlite3")
+)
+# upper bound for one sleep while waiting, so a shrinking wait (other workers idle) is noticed
+MAX_SLEEP_S = 0.25
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None, path: str = DEFAULT_PATH, name: str = "openai"):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, blocked_until REAL NOT NULL,"
+            " granted INTEGER NOT NULL DEFAULT 0, waited REAL NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO buckets(name, tokens, updated, blocked_until) VALUES(?, ?, ?, 0)",
+            (name, self.burst, time.time()),
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def try_acquire(self, n: float = 1.0) -> float:
+        """Take n tokens if they are there; returns 0.0, or the seconds until they could be."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated, blocked_until = conn.execute(
+                "SELECT tokens, updated, blocked_until FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= n:
+                tokens -= n
+                wait = 0.0
+            else:
+                wait = (n - tokens) / self.rate
+            conn.execute(
+                "UPDATE buckets SET tokens = ?, updated = ?, granted = granted + ? WHERE name = ?",
+                (tokens, now, 1 if wait == 0.0 else 0, self.name),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, n: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until n tokens are taken; False when that would take longer than timeout seconds."""
+        t0 = time.monotonic()
+        while True:
+            wait = self.try_acquire(n)
+            waited = time.monotonic() - t0
+            if wait == 0.0:
+                if waited:
+                    self._add_waited(waited)
+                return True
+            if timeout is not None and waited + wait > timeout:
+                return False
+            time.sleep(min(wait, MAX_SLEEP_S))
+
+    def penalize(self, seconds: float) -> None:
+        """Stop handing out tokens for the next `seconds` (e.g. the API's Retry-After)."""
+        conn = self._conn()
+        conn.execute(
+            "UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?", (time.time() + seconds, self.name)
+        )
+
+    def _add_waited(self, seconds: float) -> None:
+        self._conn().execute("UPDATE buckets SET waited = waited + ? WHERE name = ?", (seconds, self.name))
+
+    def stats(self) -> dict:
+        row = self._conn().execute(
+            "SELECT tokens, updated, blocked_until, granted, waited FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        tokens, updated, blocked_until, granted, waited = row
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(min(self.burst, tokens + max(0.0, time.time() - updated) * self.rate), 2),
+            "blocked_for_s": round(max(0.0, blocked_until - time.time()), 2),
+            "granted": granted,
+            "waited_s": round(waited, 3),
+        }
+
+    def reset(self) -> None:
+        self._conn().execute(
+            "UPDATE buckets SET tokens = ?, updated = ?, blocked_until = 0, granted = 0, waited = 0 WHERE name = ?",
+            (self.burst, time.time(), self.name),
+        )
+
+
+def get_limiter(path: str = DEFAULT_PATH) -> Optional[TokenBucket]:
+    """The process's limiter as configured by OPENAI_RATE_LIMIT_RPS / _BURST, or None when disabled."""
+    rate = float(os.environ.get("OPENAI_RATE_LIMIT_RPS") or 0)
+    if rate <= 0:
+        return None
+    return TokenBucket(rate, float(os.environ.get("OPENAI_RATE_LIMIT_BURST") or 0) or None, path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Inspect or reset the shared OpenAI rate limiter.")
+    ap.add_argument("command", choices=["stats", "reset"])
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args(argv)
+
+    bucket = get_limiter(args.path) or TokenBucket(1.0, path=args.path)
+    if args.command == "reset":
+        bucket.reset()
+    print(json.dumps(bucket.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
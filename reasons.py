@@ -0,0 +1,330 @@
+"""Recommendation reason text.
+
+build_reason_diversified is the original per-call implementation and stays
+as the reference. ReasonEngine does the same work from tables built once:
+every answer choice is pre-split into letter and evidence text, genre ->
+letter and tag -> question lookups are precomputed and the templates are
+compiled into literal/field parts, so generating a reason is a few index
+lookups. With seed=None it reproduces build_reason_diversified exactly; a
+seed deterministically rotates the template and flavor order.
+
+    python reasons.py verify          # engine == reference for all 78,125 profiles
+    python reasons.py digest --seed 7 # sha256 over the whole output space
+    python reasons.py bench
+"""
+import argparse
+import hashlib
+import string
+import sys
+import time
+from functools import lru_cache
+from itertools import permutations, product
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core import (
+    GENRES,
+    LETTERS,
+    NUM_PROFILES,
+    SITUATION_TAGS,
+    answers_of,
+    decode_letters,
+    genre_flavors,
+    genre_map,
+    genre_persona,
+    letter_of,
+    question_choices,
+    situation_tag_map_q5_to_q7,
+    tag_display,
+)
+
+GENRE_EV_FALLBACK = "책에서 얻고 싶은 게 있다"
+SIT_EV_FALLBACK = "요즘 책이 필요하다"
+SIT_LABEL_FALLBACK = "지금 필요한 것"
+FLAVOR_FALLBACK = "핵심"
+PERSONA_FALLBACK = "이런 성향"
+
+# =====================================================
+# Reference implementation (per-call string assembly)
+# =====================================================
+def evidence_by_genre(answers: List[str], target_genre: str) -> List[str]:
+    target_letter = next((l for l, g in genre_map.items() if g == target_genre), None)
+    return [a[3:].strip() for a in answers if target_letter and letter_of(a) == target_letter]
+
+def situation_evidence_candidates(answers: List[str], situation_tags: List[str]) -> List[str]:
+    ev = []
+    for qno in [5, 6, 7]:
+        ans = answers[qno - 1]
+        l = letter_of(ans)
+        tags = situation_tag_map_q5_to_q7[qno].get(l, [])
+        if any(t in situation_tags for t in tags):
+            ev.append(ans[3:].strip())
+    return ev
+
+def rotate_pick(items: List[str], used: set, fallback: str = "") -> str:
+    for it in items:
+        if it and it not in used:
+            used.add(it)
+            return it
+    return fallback if fallback else (items[0] if items else "")
+
+def pick_focus_tag(top_situations: List[str], idx: int) -> List[str]:
+    if not top_situations:
+        return []
+    if len(top_situations) == 1:
+        return top_situations
+    if idx == 0:
+        return [top_situations[0]]
+    if idx == 1:
+        return [top_situations[1 % len(top_situations)]]
+    return top_situations[:2]
+
+reason_templates = [
+    "최근 “{s_ev}”라고 답한 걸 보면 지금은 **{sit}**이(가) 필요해 보여요. 그리고 “{g_ev}” 선택이 많아 {persona} 성향도 강하네요. 그래서 **{title}**을(를) 추천합니다. ({flavor} 포인트에 특히 잘 맞아요.)",
+    "당신이 고른 답변 중 “{g_ev}”가 눈에 띄어요. {persona} 성향인 당신에게 **{sit}**을(를) 채워줄 책이 필요해서, {flavor}에 강한 **{title}**을(를) 골랐어요.",
+    "지금은 **{sit}**을(를) 얻는 게 우선일 것 같아요(“{s_ev}”). 동시에 “{g_ev}”를 선택한 걸 보면 {persona}답게 읽을 만한 책이 필요하죠. 그래서 **{title}**을(를) 추천합니다.",
+    "설문에서 “{s_ev}”라고 했던 점을 반영했어요. {persona} 성향의 당신에게 **{title}**은(는) {flavor}을 통해 **{sit}**에 도움을 줄 확률이 높아요.",
+    "현재 상태(“{s_ev}”)를 보면 **{sit}**을(를) 챙겨야 해요. 그리고 “{g_ev}” 선택은 {persona} 성향을 보여줘요. 그래서 {flavor}이(가) 강한 **{title}**을(를) 추천합니다.",
+]
+
+def build_reason_diversified(
+    answers: List[str],
+    title: str,
+    genre: str,
+    top_situations: List[str],
+    idx: int,
+    used_genre_ev: set,
+    used_sit_ev: set,
+    used_flavor: set,
+    used_template: set,
+) -> str:
+    focus_tags = pick_focus_tag(top_situations, idx)
+    sit_label = ", ".join([tag_display.get(t, t) for t in focus_tags]) if focus_tags else SIT_LABEL_FALLBACK
+
+    g_candidates = evidence_by_genre(answers, genre)
+    s_candidates = situation_evidence_candidates(answers, focus_tags) if focus_tags else []
+
+    g_ev = rotate_pick(g_candidates, used_genre_ev, fallback=(g_candidates[0] if g_candidates else GENRE_EV_FALLBACK))
+    s_ev = rotate_pick(s_candidates, used_sit_ev, fallback=SIT_EV_FALLBACK)
+
+    if s_ev == SIT_EV_FALLBACK:
+        q5to7 = [answers[i][3:].strip() for i in [4, 5, 6] if answers[i]]
+        if q5to7:
+            s_ev = rotate_pick(q5to7, used_sit_ev, fallback=q5to7[0])
+    if g_ev == GENRE_EV_FALLBACK:
+        q1to4 = [answers[i][3:].strip() for i in [0, 1, 2, 3] if answers[i]]
+        if q1to4:
+            g_ev = rotate_pick(q1to4, used_genre_ev, fallback=q1to4[0])
+
+    flavor_candidates = genre_flavors.get(genre, [])
+    flavor = rotate_pick(flavor_candidates, used_flavor, fallback=(flavor_candidates[0] if flavor_candidates else FLAVOR_FALLBACK))
+
+    template = rotate_pick(reason_templates, used_template, fallback=reason_templates[idx % len(reason_templates)])
+    persona = genre_persona.get(genre, PERSONA_FALLBACK)
+
+    return template.format(s_ev=s_ev, g_ev=g_ev, sit=sit_label, persona=persona, title=title, flavor=flavor)
+
+
+# =====================================================
+# Precompiled engine
+# =====================================================
+Template = Callable[..., str]
+
+
+def compile_template(fmt: str, **static: str) -> Template:
+    """Bake the static fields into the template once; the result is a bound str.format for the rest."""
+    out = []
+    for lit, field, spec, conv in string.Formatter().parse(fmt):
+        out.append(lit.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field in static:
+            out.append(static[field].replace("{", "{{").replace("}", "}}"))
+        else:
+            out.append("{" + field + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(out).format
+
+
+class ReasonEngine:
+    def __init__(self, templates: Sequence[str] = reason_templates):
+        # evidence[q][letter index] = choice text without the "A. " prefix
+        self.evidence = [[c[3:].strip() for c in choices] for choices in question_choices]
+        self.letter_of_genre = {g: l for l, g in reversed(list(genre_map.items()))}
+        self.sit_questions = sorted(qno - 1 for qno in situation_tag_map_q5_to_q7)
+
+        n = self.n_templates = len(templates)
+        # per genre (plus unknown genres under None) with the persona already filled in
+        self.templates: Dict[Optional[str], List[Template]] = {
+            g: [compile_template(t, persona=genre_persona.get(g, PERSONA_FALLBACK)) for t in templates]
+            for g in list(GENRES) + [None]
+        }
+        # seeded variants: rotations of the template order and of each genre's flavor list
+        self.template_orders = [list(range(k, n)) + list(range(k)) for k in range(n)]
+        self.flavors = {g: [fl[k:] + fl[:k] for k in range(max(len(fl), 1))] for g, fl in genre_flavors.items()}
+        # every focus pick_focus_tag can return for core tags; other tags are computed per call
+        focuses = [()] + [(t,) for t in SITUATION_TAGS] + list(permutations(SITUATION_TAGS, 2))
+        self.sit_labels = {f: self._sit_label(f) for f in focuses}
+        self.sit_evidence = {
+            ("".join(ls), f): self._sit_evidence_questions("".join(ls), f)
+            for ls in product(LETTERS, repeat=len(self.sit_questions))
+            for f in focuses
+        }
+
+    def sit_label(self, focus: Tuple[str, ...]) -> str:
+        label = self.sit_labels.get(focus)
+        return label if label is not None else self._sit_label(focus)
+
+    def sit_evidence_questions(self, sit_letters: str, focus: Tuple[str, ...]) -> Tuple[int, ...]:
+        """Questions among q5-q7 whose chosen letter carries one of the focus tags."""
+        qs = self.sit_evidence.get((sit_letters, focus))
+        return qs if qs is not None else self._sit_evidence_questions(sit_letters, focus)
+
+    @staticmethod
+    def _sit_label(focus: Tuple[str, ...]) -> str:
+        return ", ".join(tag_display.get(t, t) for t in focus) if focus else SIT_LABEL_FALLBACK
+
+    def _sit_evidence_questions(self, sit_letters: str, focus: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(
+            q for q, l in zip(self.sit_questions, sit_letters)
+            if any(t in focus for t in situation_tag_map_q5_to_q7[q + 1].get(l, []))
+        )
+
+    @staticmethod
+    def new_state() -> Tuple[set, set, set, set]:
+        return set(), set(), set(), set()
+
+    def prepare(self, letters: str) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Evidence texts in question order and grouped by answer letter."""
+        texts = [self.evidence[q][LETTERS.index(l)] for q, l in enumerate(letters)]
+        by_letter: Dict[str, List[str]] = {}
+        for l, t in zip(letters, texts):
+            by_letter.setdefault(l, []).append(t)
+        return texts, by_letter
+
+    def reason(
+        self,
+        letters: str,
+        title: str,
+        genre: str,
+        top_situations: List[str],
+        idx: int,
+        state: Tuple[set, set, set, set],
+        seed: Optional[int] = None,
+        prepared: Optional[Tuple[List[str], Dict[str, List[str]]]] = None,
+    ) -> str:
+        used_g, used_s, used_f, used_t = state
+        texts, by_letter = prepared or self.prepare(letters)
+
+        focus = tuple(pick_focus_tag(top_situations, idx))
+        gl = self.letter_of_genre.get(genre)
+        g_c = by_letter.get(gl, []) if gl else []
+        s_c = [texts[q] for q in self.sit_evidence_questions(letters[4:7], focus)] if focus else []
+
+        g_ev = rotate_pick(g_c, used_g, fallback=(g_c[0] if g_c else GENRE_EV_FALLBACK))
+        s_ev = rotate_pick(s_c, used_s, fallback=SIT_EV_FALLBACK)
+        if s_ev == SIT_EV_FALLBACK:
+            q5to7 = texts[4:7]
+            s_ev = rotate_pick(q5to7, used_s, fallback=q5to7[0])
+        if g_ev == GENRE_EV_FALLBACK:
+            q1to4 = texts[0:4]
+            g_ev = rotate_pick(q1to4, used_g, fallback=q1to4[0])
+
+        rot = seed or 0
+        variants = self.flavors.get(genre)
+        fl = variants[(rot // self.n_templates) % len(variants)] if variants else []
+        flavor = rotate_pick(fl, used_f, fallback=(fl[0] if fl else FLAVOR_FALLBACK))
+
+        t = _rotate_pick_index(self.template_orders[rot % self.n_templates], used_t)
+        if t is None:
+            t = idx % self.n_templates
+        render = self.templates[genre if genre in self.templates else None][t]
+        return render(s_ev=s_ev, g_ev=g_ev, sit=self.sit_label(focus), title=title, flavor=flavor)
+
+    def reasons(
+        self, letters: str, books: Sequence[Tuple[str, str]], top_situations: List[str], seed: Optional[int] = None
+    ) -> List[str]:
+        """Reasons for (title, genre) books in display order, sharing one rotation state."""
+        state = self.new_state()
+        prepared = self.prepare(letters)
+        return [
+            self.reason(letters, title, genre, top_situations, idx, state, seed, prepared)
+            for idx, (title, genre) in enumerate(books)
+        ]
+
+
+def _rotate_pick_index(order: List[int], used: set) -> Optional[int]:
+    for i in order:
+        if i not in used:
+            used.add(i)
+            return i
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> ReasonEngine:
+    return ReasonEngine()
+
+
+# =====================================================
+# Bulk regression / benchmark over every profile
+# =====================================================
+def sample_books(letters: str, top_genres: List[str], second_genres: List[str]) -> List[Tuple[str, str]]:
+    """Deterministic stand-in books for a profile (genre mix like the real pickers)."""
+    genres = (top_genres[:2] + second_genres[:1] + GENRES)[:3]
+    return [(f"책{i + 1}-{letters}", g) for i, g in enumerate(genres)]
+
+
+def iter_profiles():
+    from profile_table import load_or_build
+
+    table = load_or_build()
+    for code in range(NUM_PROFILES):
+        p = table.lookup(code)
+        letters = decode_letters(code)
+        yield letters, sample_books(letters, p.top_genres, p.second_genres), p.top_situations
+
+
+def reference_reasons(letters: str, books: Sequence[Tuple[str, str]], top_situations: List[str]) -> List[str]:
+    answers = answers_of(letters)
+    used = (set(), set(), set(), set())
+    return [
+        build_reason_diversified(answers, title, genre, top_situations, idx, *used)
+        for idx, (title, genre) in enumerate(books)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Verify, digest or benchmark the reason engine over all profiles.")
+    ap.add_argument("command", choices=["verify", "digest", "bench"])
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+    engine = get_engine()
+    profiles = list(iter_profiles())
+
+    if args.command == "verify":
+        bad = [p[0] for p in profiles if engine.reasons(*p) != reference_reasons(*p)]
+        if bad:
+            print(f"{len(bad)} profiles differ from build_reason_diversified, e.g. {bad[:5]}")
+            return 1
+        print(f"ok: {len(profiles)} profiles match build_reason_diversified")
+        return 0
+
+    if args.command == "digest":
+        h = hashlib.sha256()
+        for p in profiles:
+            for text in engine.reasons(*p, seed=args.seed):
+                h.update(text.encode("utf-8"))
+                h.update(b"\0")
+        print(h.hexdigest())
+        return 0
+
+    for name, fn in [("reference", reference_reasons), ("engine", lambda *p: engine.reasons(*p, seed=args.seed))]:
+        t0 = time.perf_counter()
+        for p in profiles:
+            fn(*p)
+        dt = time.perf_counter() - t0
+        print(f"{name:9s} {len(profiles) / dt:10.0f} profiles/s  {dt / len(profiles) * 1e6:6.1f} us/profile")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Persistent recommendation cache shared by every app process on the host.
+
+Entries live in a SQLite file (WAL mode) so several Streamlit workers can read
+and write concurrently. Keys are built from the normalized profile only
+(model, focus_genres, top_situations, answer letters); the API key and the
+prompt text never take part.
+
+Each stored result is written under two keys: the exact profile and a shared
+(model, focus_genres, top_situations) key. A lookup tries the exact key first
+and then the shared one, so profiles that only differ in answers which do not
+move the genre/situation outcome reuse one LLM result.
+
+Lookups do not write: the access times they refresh (for LRU eviction) and
+the shared hit / miss counters are kept in memory and flushed in one
+transaction at most every FLUSH_INTERVAL_S, and eviction runs every
+EVICT_EVERY puts, so the workers of a multi-process deployment rarely wait
+on the database's single write lock.
+
+    python rec_cache.py stats
+    python rec_cache.py purge
+    python rec_cache.py prewarm --model gpt-4o-mini [--profiles FILE] [--limit N]
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core import NUM_PROFILES, answers_of, decode_letters, encode_letters
+from llm import ai_pick_books_korean_only
+from profile_table import load_or_build
+
+DEFAULT_PATH = os.environ.get(
+    "REC_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rec_cache.sqlite3")
+)
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50_000
+FLUSH_INTERVAL_S = 5.0
+EVICT_EVERY = 256
+
+
+def profile_key(model: str, focus_genres: List[str], top_situations: List[str], letters: Optional[str] = None) -> str:
+    src = json.dumps([model, list(focus_genres), list(top_situations), letters], ensure_ascii=False)
+    return hashlib.sha1(src.encode("utf-8")).hexdigest()
+
+
+class RecCache:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        # not yet written: key -> last access time, stats name -> increment
+        self._touched: Dict[str, float] = {}
+        self._pending: Counter = Counter()
+        self._flushed_at = time.monotonic()
+        self._puts = 0
+        atexit.register(self.flush)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recs ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS recs_accessed ON recs(accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+            self._pending[name] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._flushed_at >= FLUSH_INTERVAL_S:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered access times and stats counters in one transaction."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not touched and not pending:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE recs SET accessed = MAX(accessed, ?) WHERE key = ?", [(t, k) for k, t in touched.items()]
+            )
+            conn.executemany(
+                "INSERT INTO stats(name, value) VALUES(?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(pending.items()),
+            )
+
+    # ---- raw key/value ----
+    def get(self, key: str) -> Optional[list]:
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            row = conn.execute("SELECT value, created FROM recs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM recs WHERE key = ?", (key,))
+                return None
+        with self._lock:
+            self._touched[key] = now
+        return json.loads(row[0])
+
+    def put(self, key: str, value: list, replace: bool = True) -> None:
+        conn = self._conn()
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with conn:
+            conn.execute(
+                f"{verb} INTO recs(key, value, created, accessed) VALUES(?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+        else:
+            self._maybe_flush()
+
+    def evict(self) -> None:
+        """Drop the least recently used entries beyond max_entries."""
+        self.flush()
+        with self._conn() as conn:
+            (n,) = conn.execute("SELECT COUNT(*) FROM recs").fetchone()
+            if n > self.max_entries:
+                conn.execute(
+                    "DELETE FROM recs WHERE key IN (SELECT key FROM recs ORDER BY accessed ASC LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+
+    # ---- profile-level API ----
+    def get_profile(self, model: str, focus_genres: List[str], top_situations: List[str], letters: str) -> Optional[list]:
+        hit = self.get(profile_key(model, focus_genres, top_situations, letters))
+        name = "hits"
+        if hit is None:
+            hit = self.get(profile_key(model, focus_genres, top_situations))
+            name = "shared_hits" if hit is not None else "misses"
+        self._count(name)
+        return hit
+
+    def put_profile(self, model: str, focus_genres: List[str], top_situations: List[str], letters: Optional[str], value: list) -> None:
+        if letters:
+            self.put(profile_key(model, focus_genres, top_situations, letters), value)
+        self.put(profile_key(model, focus_genres, top_situations), value, replace=False)
+
+    # ---- maintenance ----
+    def purge_expired(self) -> int:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM recs WHERE created < ?", (time.time() - self.ttl,)).rowcount
+
+    def stats(self) -> dict:
+        self.flush()
+        conn = self._conn()
+        (entries,) = conn.execute("SELECT COUNT(*) FROM recs").fetchone()
+        shared = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        return {"entries": entries, "process": dict(self.counters), "shared": shared}
+
+
+# =====================================================
+# Pre-warm
+# =====================================================
+def common_profiles(limit: Optional[int] = None) -> List[str]:
+    """One representative answer string per (focus_genres, top_situations) group, biggest groups first."""
+    table = load_or_build()
+    groups = {}
+    for code in range(NUM_PROFILES):
+        p = table.lookup(code)
+        g = groups.setdefault((tuple(p.focus_genres), tuple(p.top_situations)), [code, 0])
+        g[1] += 1
+    ordered = sorted(groups.values(), key=lambda g: g[1], reverse=True)
+    return [decode_letters(code) for code, _ in ordered[:limit]]
+
+
+def read_profiles(path: str) -> List[str]:
+    src = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with src:
+        return [line.split()[0].strip().upper() for line in src if line.strip()]
+
+
+def prewarm(cache: RecCache, api_key: str, model: str, profiles: Iterable[str]) -> Tuple[int, int, int]:
+    table = load_or_build()
+    filled = skipped = failed = 0
+    for letters in profiles:
+        answers = answers_of(letters)
+        p = table.lookup(encode_letters(letters))
+        if cache.get(profile_key(model, p.focus_genres, p.top_situations, letters)) is not None:
+            skipped += 1
+            continue
+        try:
+            recs = ai_pick_books_korean_only(api_key, model, answers, p.focus_genres, p.top_situations)
+        except Exception as e:
+            print(f"{letters}: {type(e).__name__}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if len(recs) == 3:
+            cache.put_profile(model, p.focus_genres, p.top_situations, letters, recs)
+            filled += 1
+        else:
+            failed += 1
+    return filled, skipped, failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Inspect or pre-warm the shared recommendation cache.")
+    ap.add_argument("command", choices=["stats", "purge", "prewarm"])
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--profiles", help="file with one answer-letter string per line (e.g. ABCDEAE, or event_log.py profiles --out), '-' for stdin")
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    cache = RecCache(args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "purge":
+        print(f"removed {cache.purge_expired()} expired entries")
+        return 0
+
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        print("OPENAI_API_KEY is not set", file=sys.stderr)
+        return 2
+    profiles = read_profiles(args.profiles)[: args.limit] if args.profiles else common_profiles(args.limit)
+    filled, skipped, failed = prewarm(cache, api_key, args.model, profiles)
+    print(f"filled {filled}, already cached {skipped}, failed {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""Streamlit-free recommendation core and a JSONL batch CLI.
+
+Everything the app does between "answers" and "three books with reasons"
+lives here: profile lookup (profile_table.py), local ranking (catalog.py /
+similarity.py), the AI top-up and reason text (reasons.py). app.py only
+adds widgets, the AI race and rendering on top.
+
+    python recommender.py [--in answers.jsonl] [--out results.jsonl] [--workers N] [--noise 0.05 --seed 1]
+    python recommender.py --ai [--model gpt-4o-mini] [--concurrency 8] [--prompt compact|full] < answers.jsonl
+
+Each input line is an answer set: a 7-letter string ("ABCDEAB"), a list
+of letters or full choice texts, or an object with "answers" (and an
+optional "id", copied to the output). Each output line is the result dict
+the app renders, or {"id", "error"} for a row that does not parse.
+Without --ai the rows are scored in chunks on a process pool; with --ai
+each row goes through the cached, coalesced OpenAI path on the asyncio
+client (openai_client.AsyncOpenAIClient), at most --concurrency calls at
+once, and falls back to the local pick when the call fails; the OpenAI
+token usage of the run (per prompt mode, see llm.py) is printed at the
+end, which is how the compact and full prompts are compared.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog import get_catalog
+from core import GENRES, LETTERS, NUM_QUESTIONS, SITUATION_TAGS, answers_of, encode_letters, letter_of
+from profile_table import Profile, ProfileTable, load_or_build
+from reasons import get_engine
+from similarity import get_recommender
+
+log = logging.getLogger(__name__)
+
+# small score noise so repeat visits with the same answers still see some variety
+LOCAL_NOISE = 0.05
+
+
+@lru_cache(maxsize=None)
+def get_table() -> ProfileTable:
+    return load_or_build()
+
+
+def score(letters: str) -> Profile:
+    return get_table().lookup(encode_letters(letters))
+
+
+def parse_answers(obj) -> str:
+    """Answer letters from a 7-letter string, a list of letters / choice texts, or {"answers": ...}."""
+    if isinstance(obj, dict):
+        obj = obj.get("answers")
+    if isinstance(obj, str):
+        letters = obj.strip().upper()
+    elif isinstance(obj, list) and all(isinstance(a, str) and a for a in obj):
+        letters = "".join(letter_of(a.strip()).upper() for a in obj)
+    else:
+        raise ValueError("answers must be a letter string or a list of answers")
+    if len(letters) != NUM_QUESTIONS or any(l not in LETTERS for l in letters):
+        raise ValueError(f"not a {NUM_QUESTIONS}-answer profile: {letters!r}")
+    return letters
+
+
+# =====================================================
+# Local recommendation (curated catalog + similarity ranking)
+# =====================================================
+def pick_3_books(top_genres: List[str], second_genres: List[str], top_situations: Optional[List[str]] = None):
+    cat = get_catalog()
+    tags = top_situations or []
+    if len(top_genres) >= 2:
+        return [cat.book(i) for i in cat.sample(top_genres[:2], 3, tags)]
+
+    primary = top_genres[0]
+    if second_genres and second_genres[0] != primary:
+        rows = cat.sample([primary], 2, tags)
+        rows += cat.sample([second_genres[0]], 1, tags, exclude={cat.titles[i] for i in rows})
+        random.shuffle(rows)
+        return [cat.book(i) for i in rows]
+    return [cat.book(i) for i in cat.sample([primary], 3, tags)]
+
+
+def score_matrix(profiles: Sequence[Profile]) -> Tuple[np.ndarray, np.ndarray]:
+    g = np.array([[p.genre_scores[k] for k in GENRES] for p in profiles], dtype=np.float64).reshape(-1, len(GENRES))
+    s = np.array([[p.situation_scores[t] for t in SITUATION_TAGS] for p in profiles], dtype=np.float64)
+    return g, s.reshape(-1, len(SITUATION_TAGS))
+
+
+def recommend_local(
+    genre_scores: dict, situation_scores: dict, noise: float = LOCAL_NOISE, rng: Optional[np.random.Generator] = None
+) -> List[dict]:
+    rec = get_recommender()
+    rows = rec.recommend_batch(
+        np.asarray([[genre_scores[g] for g in GENRES]]),
+        np.asarray([[situation_scores[t] for t in SITUATION_TAGS]]),
+        noise=noise,
+        rng=rng,
+    )
+    return [rec.catalog.book(int(i)) for i in rows[0] if i >= 0]
+
+
+def top_up_books(
+    candidates: List[dict],
+    top_genres: List[str],
+    second_genres: List[str],
+    local: Optional[List[dict]] = None,
+    top_situations: Optional[List[str]] = None,
+) -> List[dict]:
+    out = list(candidates)
+    seen = {c["title"] for c in out}
+    for b in local if local is not None else pick_3_books(top_genres, second_genres, top_situations):
+        if len(out) == 3:
+            break
+        if b["title"] in seen:
+            continue
+        seen.add(b["title"])
+        out.append({"title": b["title"], "author": b.get("author", ""), "genre": b["genre"]})
+    if len(out) < 3:
+        cat = get_catalog()
+        out += [cat.book(i) for i in cat.sample(top_genres + second_genres, 3 - len(out), top_situations or [], exclude=seen)]
+    return out
+
+
+# =====================================================
+# Reason text + result
+# =====================================================
+def with_reasons(letters: str, candidates: List[dict], top_situations: List[str], seed: Optional[int] = None) -> List[dict]:
+    whys = get_engine().reasons(letters, [(c["title"], c["genre"]) for c in candidates[:3]], top_situations, seed=seed)
+    return [{**c, "why": why} for c, why in zip(candidates, whys)]
+
+
+def build_result(
+    letters: str,
+    profile: Profile,
+    ai_recs: Sequence[dict] = (),
+    local: Optional[List[dict]] = None,
+    ai_error: str = "",
+    path: str = "local",
+) -> dict:
+    """The result dict the app renders; a partial AI answer is topped up from the local pick."""
+    ai_books = len(ai_recs[:3])
+    candidates = top_up_books(list(ai_recs[:3]), profile.top_genres, profile.second_genres, local, profile.top_situations)
+    return {
+        "genre_scores": profile.genre_scores,
+        "genre_top": profile.top_genres,
+        "situation_scores": profile.situation_scores,
+        "situation_top": profile.top_situations,
+        "books": with_reasons(letters, candidates, profile.top_situations),
+        "answers": letters,
+        "used_ai": ai_books > 0,
+        "ai_books": ai_books,
+        "ai_error": ai_error,
+        "path": path,
+    }
+
+
+def recommend(letters: str, noise: float = LOCAL_NOISE, rng: Optional[np.random.Generator] = None) -> dict:
+    """AI-free recommendation for one answer profile."""
+    p = score(letters)
+    return build_result(letters, p, local=recommend_local(p.genre_scores, p.situation_scores, noise, rng))
+
+
+# =====================================================
+# Batch scoring (JSONL in, JSONL out)
+# =====================================================
+def _parse_line(n: int, line: str) -> Tuple[object, Optional[str], str]:
+    """(row id, letters or None, error)."""
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        obj = line.strip()
+    row_id = obj.get("id", n) if isinstance(obj, dict) else n
+    try:
+        return row_id, parse_answers(obj), ""
+    except ValueError as e:
+        return row_id, None, str(e)
+
+
+def _dump(row_id, result: dict) -> str:
+    return json.dumps({"id": row_id, **result}, ensure_ascii=False)
+
+
+# output rows are (JSON line, parsed ok)
+Row = Tuple[str, bool]
+
+
+def score_lines(start: int, lines: List[str], noise: float = 0.0, seed: Optional[int] = None) -> List[Row]:
+    """Score one chunk of input lines (numbered from start) with a single vectorized ranking pass."""
+    rows = [_parse_line(start + i, line) for i, line in enumerate(lines)]
+    valid = [i for i, r in enumerate(rows) if r[1] is not None]
+    profiles = [score(rows[i][1]) for i in valid]
+
+    rec = get_recommender()
+    ranked = np.empty((0, 3), dtype=np.int64)
+    if profiles:
+        rng = np.random.default_rng(None if seed is None else (seed, start)) if noise else None
+        ranked = rec.recommend_batch(*score_matrix(profiles), noise=noise, rng=rng)
+
+    results = {}
+    for i, p, picks in zip(valid, profiles, ranked):
+        local = [rec.catalog.book(int(b)) for b in picks if b >= 0]
+        results[i] = build_result(rows[i][1], p, local=local)
+    return [
+        (_dump(row_id, results[i]), True) if i in results else (_dump(row_id, {"error": err}), False)
+        for i, (row_id, _, err) in enumerate(rows)
+    ]
+
+
+def _warm() -> None:
+    get_table(), get_recommender(), get_engine()
+
+
+def chunked(lines: Iterable[str], size: int) -> Iterator[Tuple[int, List[str]]]:
+    buf: List[str] = []
+    start = n = 1
+    for line in lines:
+        if not line.strip():
+            continue
+        buf.append(line)
+        n += 1
+        if len(buf) >= size:
+            yield start, buf
+            start, buf = n, []
+    if buf:
+        yield start, buf
+
+
+def ordered_window(submit: Callable, items: Iterable, window: int) -> Iterator:
+    """submit() items with at most `window` outstanding, yielding results in input order."""
+    pending: deque = deque()
+    for item in items:
+        pending.append(submit(item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_local(
+    lines: Iterable[str], workers: int = 0, chunk: int = 512, noise: float = 0.0, seed: Optional[int] = None
+) -> Iterator[Row]:
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(lines, chunk)
+    if workers == 1:
+        for start, part in chunks:
+            yield from score_lines(start, part, noise, seed)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm) as ex:
+        submit = lambda c: ex.submit(score_lines, c[0], c[1], noise, seed)
+        for out in ordered_window(submit, chunks, window=workers * 2):
+            yield from out
+
+
+async def run_ai(
+    lines: Iterable[str], api_key: str, model: str, concurrency: int = 8, cache=None, noise: float = 0.0, prompt: str = ""
+) -> AsyncIterator[Row]:
+    """Results in input order; at most `concurrency` OpenAI calls (and a few rows beyond) in flight."""
+    import llm
+    from openai_client import OpenAIError
+
+    # request attempts and cache calls of AsyncOpenAIClient / ai_pick_books_async run here
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    sem = asyncio.Semaphore(concurrency)
+    flights: Dict[tuple, asyncio.Future] = {}
+
+    async def fetch(letters: str, p: Profile) -> List[dict]:
+        async with sem:
+            return await llm.ai_pick_books_async(
+                api_key, model, answers_of(letters), p.focus_genres, p.top_situations, cache, prompt
+            )
+
+    async def ai_pick(letters: str, p: Profile) -> List[dict]:
+        # rows with the same profile in flight share one call
+        key = llm.flight_key(model, p.focus_genres, p.top_situations, letters)
+        task = flights.get(key)
+        if task is None:
+            task = flights[key] = asyncio.ensure_future(fetch(letters, p))
+            task.add_done_callback(lambda _: flights.pop(key, None))
+        return list(await asyncio.shield(task))
+
+    async def one(n: int, line: str) -> Row:
+        row_id, letters, err = _parse_line(n, line)
+        if letters is None:
+            return _dump(row_id, {"error": err}), False
+        p = score(letters)
+        ai_recs, ai_error, path = [], "", "ai"
+        try:
+            ai_recs = await ai_pick(letters, p)
+        except OpenAIError as e:
+            ai_error, path = e.reason, "local"
+        except Exception as e:
+            # a cache or cleaning failure costs this row its AI answer, not the whole run
+            log.exception("row %s: AI recommendation failed", row_id)
+            ai_error, path = type(e).__name__, "local"
+        local = recommend_local(p.genre_scores, p.situation_scores, noise) if len(ai_recs) < 3 else []
+        return _dump(row_id, build_result(letters, p, ai_recs, local, ai_error, path)), True
+
+    pending: deque = deque()
+    n = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        n += 1
+        pending.append(asyncio.ensure_future(one(n, line)))
+        if len(pending) >= concurrency * 4:
+            yield await pending.popleft()
+    while pending:
+        yield await pending.popleft()
+
+
+def print_token_usage() -> None:
+    from metrics import metrics
+
+    counters = metrics.counters()
+    for labels, calls in sorted(counters.get("openai_calls", {}).items()):
+        prompt = dict(labels)["prompt"]
+        tokens = {dict(k)["kind"]: n for k, n in counters.get("openai_tokens", {}).items() if dict(k)["prompt"] == prompt}
+        print(
+            f"openai[{prompt}] {calls} calls, tokens/call: prompt {tokens.get('prompt', 0) / calls:.0f}"
+            f" (cached {tokens.get('cached', 0) / calls:.0f}), completion {tokens.get('completion', 0) / calls:.0f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Score JSONL answer sets and write JSONL recommendations.")
+    ap.add_argument("--in", dest="src", default="-", help="input JSONL, '-' for stdin")
+    ap.add_argument("--out", default="-", help="output JSONL, '-' for stdout")
+    ap.add_argument("--workers", type=int, default=0, help="processes for the local path (0: one per CPU)")
+    ap.add_argument("--chunk", type=int, default=512, help="rows per process task")
+    ap.add_argument("--noise", type=float, default=0.0, help="ranking noise (the app uses %s)" % LOCAL_NOISE)
+    ap.add_argument("--seed", type=int, default=None, help="seed for --noise, reproducible across --workers")
+    ap.add_argument("--ai", action="store_true", help="ask OpenAI (OPENAI_API_KEY), local pick as fallback")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--concurrency", type=int, default=8, help="OpenAI calls in flight with --ai")
+    ap.add_argument("--cache", default=None, help="recommendation cache file with --ai (default: the app's)")
+    ap.add_argument("--prompt", choices=["compact", "full"], default=None, help="prompt mode with --ai (default: OPENAI_PROMPT_MODE or full)")
+    args = ap.parse_args(argv)
+
+    src = sys.stdin if args.src == "-" else open(args.src, encoding="utf-8")
+    dst = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    t0 = time.perf_counter()
+    rows = errors = 0
+
+    def write(row: Row) -> None:
+        nonlocal rows, errors
+        rows += 1
+        errors += not row[1]
+        dst.write(row[0] + "\n")
+
+    try:
+        if args.ai:
+            api_key = os.environ.get("OPENAI_API_KEY", "")
+            if not api_key:
+                print("OPENAI_API_KEY is not set", file=sys.stderr)
+                return 2
+            from rec_cache import RecCache
+
+            cache = RecCache(args.cache) if args.cache else RecCache()
+
+            async def drain():
+                async for row in run_ai(src, api_key, args.model, args.concurrency, cache, args.noise, args.prompt or ""):
+                    write(row)
+
+            asyncio.run(drain())
+        else:
+            for row in run_local(src, args.workers, args.chunk, args.noise, args.seed):
+                write(row)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    dt = time.perf_counter() - t0
+    print(f"{rows} rows ({errors} invalid) in {dt:.2f}s, {rows / dt if dt else 0:.0f} rows/s", file=sys.stderr)
+    if args.ai:
+        print_token_usage()
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
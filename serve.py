@@ -0,0 +1,221 @@
+"""Multi-process deployment: N Streamlit workers behind a local nginx.
+
+Each worker is a separate `streamlit run app.py` on its own port, so the
+script runs, scoring and rendering of different sessions use different
+cores. What has to be shared lives in local files every worker opens: the
+recommendation cache (rec_cache.py) and the token bucket for OpenAI calls
+(ratelimit.py) are SQLite files in WAL mode, the submission event log
+(event_log.py) is one directory with a segment file per worker.
+Per-process state stays per process: the profile table mmap, prefetch /
+single-flight and metrics (METRICS_PROM_PATH / METRICS_JSONL_PATH get the
+worker port inserted, so workers do not overwrite each other's files).
+
+Before the workers start, the static artifacts are built once (profile
+table, compiled catalog), so no worker pays for that on its first request
+and several workers never race to build the same file.
+
+    python serve.py --workers 4 [--base-port 8601] [--listen 8080] [--rps 3 --burst 6] [--nginx]
+    python serve.py --prepare-only    # just build the artifacts, e.g. in an image build step
+
+writes the nginx config for the workers (default deploy/nginx.conf) and,
+with --nginx, runs nginx in the foreground next to them. Without nginx the
+workers are still reachable directly on their ports.
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "app.py")
+NGINX_CONF = os.path.join(ROOT, "deploy", "nginx.conf")
+
+NGINX_TEMPLATE = """\
+# generated by serve.py for {n} Streamlit worker(s); run from this directory with
+#   nginx -p . -c nginx.conf -g 'daemon off;'    (or: python serve.py --nginx)
+worker_processes auto;
+pid nginx.pid;
+error_log stderr warn;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    access_log off;
+    client_body_temp_path tmp/body;
+    proxy_temp_path tmp/proxy;
+    fastcgi_temp_path tmp/fastcgi;
+    uwsgi_temp_path tmp/uwsgi;
+    scgi_temp_path tmp/scgi;
+
+    map $http_upgrade $connection_upgrade {{
+        default upgrade;
+        ''      close;
+    }}
+
+    # A browser session is one long-lived websocket (/_stcore/stream), so
+    # least_conn balances sessions, not requests. A reconnect can land on
+    # another worker and starts a new session there; use ip_hash instead
+    # when clients are spread over many addresses and that matters.
+    upstream streamlit {{
+        least_conn;
+{servers}
+    }}
+
+    server {{
+        listen {listen};
+
+        location / {{
+            proxy_pass http://streamlit;
+            proxy_http_version 1.1;
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection $connection_upgrade;
+            proxy_set_header Host $host;
+            proxy_buffering off;
+            proxy_read_timeout 1d;
+        }}
+    }}
+}}
+"""
+
+
+def nginx_conf(ports: List[int], listen: int = 8080) -> str:
+    servers = "\n".join(f"        server 127.0.0.1:{p};" for p in ports)
+    return NGINX_TEMPLATE.format(n=len(ports), servers=servers, listen=listen)
+
+
+def worker_env(port: int, base: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environment for one worker: shared state paths made absolute, per-worker metrics files."""
+    env = dict(os.environ if base is None else base)
+    env.setdefault("REC_CACHE_PATH", os.path.join(ROOT, "rec_cache.sqlite3"))
+    env.setdefault("RATE_LIMIT_PATH", os.path.join(ROOT, "ratelimit.sqlite3"))
+    env.setdefault("EVENT_LOG_DIR", os.path.join(ROOT, "events"))
+    for k in ("REC_CACHE_PATH", "RATE_LIMIT_PATH", "EVENT_LOG_DIR"):
+        env[k] = os.path.abspath(env[k])
+    for k in ("METRICS_PROM_PATH", "METRICS_JSONL_PATH"):
+        if env.get(k):
+            stem, ext = os.path.splitext(env[k])
+            env[k] = f"{stem}-{port}{ext}"
+    return env
+
+
+def prepare_static() -> List[str]:
+    """Build whatever static artifact is missing or stale; returns their paths."""
+    from catalog import DEFAULT_PATH as CATALOG_PATH, compile_catalog, compiled_path
+    from profile_table import DEFAULT_PATH as TABLE_PATH, load_or_build
+
+    load_or_build(TABLE_PATH).close()
+    compiled = compiled_path(CATALOG_PATH)
+    if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(CATALOG_PATH):
+        compile_catalog(CATALOG_PATH)
+    return [TABLE_PATH, compiled]
+
+
+def start_workers(
+    n: int, base_port: int = 8601, app_path: str = APP_PATH, env: Optional[Dict[str, str]] = None, quiet: bool = False
+) -> List[subprocess.Popen]:
+    out = subprocess.DEVNULL if quiet else None
+    procs = []
+    for port in range(base_port, base_port + n):
+        cmd = [
+            sys.executable, "-m", "streamlit", "run", app_path,
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+            "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false",
+        ]
+        procs.append(subprocess.Popen(cmd, env=worker_env(port, env), stdout=out, stderr=out))
+    return procs
+
+
+def wait_healthy(ports: List[int], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=2).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"worker on port {port} did not become healthy in {timeout:.0f}s")
+            time.sleep(0.2)
+
+
+def stop(procs: List[subprocess.Popen], timeout: float = 10.0) -> None:
+    for p in procs:
+        if p.poll() is None:
+            p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def start_nginx(conf: str) -> subprocess.Popen:
+    prefix = os.path.dirname(os.path.abspath(conf))
+    os.makedirs(os.path.join(prefix, "tmp"), exist_ok=True)
+    return subprocess.Popen(["nginx", "-p", prefix, "-c", os.path.abspath(conf), "-g", "daemon off;"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Run several Streamlit workers sharing one cache and one OpenAI rate limit.")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--base-port", type=int, default=8601)
+    ap.add_argument("--listen", type=int, default=8080, help="nginx port")
+    ap.add_argument("--app", default=APP_PATH)
+    ap.add_argument("--rps", type=float, default=None, help="global OpenAI requests/s (sets OPENAI_RATE_LIMIT_RPS)")
+    ap.add_argument("--burst", type=float, default=None, help="token bucket size (OPENAI_RATE_LIMIT_BURST)")
+    ap.add_argument("--nginx-conf", default=NGINX_CONF)
+    ap.add_argument("--nginx", action="store_true", help="also run nginx in the foreground")
+    ap.add_argument("--prepare-only", action="store_true", help="build the static artifacts and exit")
+    args = ap.parse_args(argv)
+
+    for path in prepare_static():
+        print(f"ready {path}")
+    if args.prepare_only:
+        return 0
+
+    ports = list(range(args.base_port, args.base_port + args.workers))
+    os.makedirs(os.path.dirname(os.path.abspath(args.nginx_conf)), exist_ok=True)
+    with open(args.nginx_conf, "w", encoding="utf-8") as f:
+        f.write(nginx_conf(ports, args.listen))
+    print(f"wrote {args.nginx_conf}")
+
+    env = dict(os.environ)
+    if args.rps is not None:
+        env["OPENAI_RATE_LIMIT_RPS"] = str(args.rps)
+    if args.burst is not None:
+        env["OPENAI_RATE_LIMIT_BURST"] = str(args.burst)
+    procs = start_workers(args.workers, args.base_port, os.path.abspath(args.app), env)
+    try:
+        wait_healthy(ports)
+        print(f"{args.workers} worker(s) on ports {ports[0]}-{ports[-1]}")
+        if args.nginx:
+            if not shutil.which("nginx"):
+                print("nginx not found; workers are reachable on their own ports", file=sys.stderr)
+            else:
+                procs.append(start_nginx(args.nginx_conf))
+                print(f"nginx on http://127.0.0.1:{args.listen}")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        while all(p.poll() is None for p in procs):
+            time.sleep(1)
+        print("a worker exited, shutting down", file=sys.stderr)
+        return 1
+    except (KeyboardInterrupt, SystemExit):
+        return 0
+    finally:
+        stop(procs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
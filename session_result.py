@@ -0,0 +1,194 @@
+"""Compact per-session result and session memory accounting.
+
+st.session_state.result used to hold the full rendered result per user:
+the answer string, both score dicts, the top lists and three book dicts
+with long Korean reason texts. CompactResult keeps only what cannot be
+recomputed cheaply:
+
+- the answers as the base-5 profile code (core.encode_letters),
+- genre and situation scores as one 9-byte array (GENRES then SITUATION_TAGS),
+- books as catalog ids, or (title, author, genre) tuples of interned
+  strings for AI books that are not in the catalog,
+- the reason seed (0 reproduces the original reason text).
+
+expand() rebuilds the dict build_result returns, regenerating the reasons
+with the ReasonEngine; it is lru_cached and shared by every session, so
+identical results on screen are expanded once per process.
+
+    python session_result.py report [--n 2000] [--ai] [--seed 0]
+"""
+import argparse
+import random
+import sys
+from functools import lru_cache
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from catalog import get_catalog
+from core import GENRES, NUM_PROFILES, SITUATION_TAGS, decode_letters, encode_letters, top_keys
+from profile_table import Profile
+from recommender import recommend_local, score, top_up_books, with_reasons
+
+# catalog id, or interned (title, author, genre)
+BookRef = Union[int, Tuple[str, str, str]]
+
+EXPAND_CACHE_SIZE = 1024
+
+
+class CompactResult(NamedTuple):
+    code: int
+    scores: bytes
+    books: Tuple[BookRef, ...]
+    ai_books: int = 0
+    ai_error: str = ""
+    path: str = "local"
+    latency_ms: Optional[int] = None
+    seed: int = 0
+
+    @property
+    def used_ai(self) -> bool:
+        return self.ai_books > 0
+
+    @property
+    def letters(self) -> str:
+        return decode_letters(self.code)
+
+
+def book_ref(b: dict) -> BookRef:
+    cat = get_catalog()
+    title, author = b["title"], b.get("author", "")
+    row = cat.row_of_title.get(title)
+    if row is not None and cat.authors[row] == author and GENRES[cat.genre[row]] == b["genre"]:
+        return int(cat.ids[row])
+    return (sys.intern(title), sys.intern(author), sys.intern(b["genre"]))
+
+
+def book_of(ref: BookRef) -> dict:
+    if isinstance(ref, tuple):
+        return {"title": ref[0], "author": ref[1], "genre": ref[2]}
+    cat = get_catalog()
+    return cat.book(cat.row_of_id[ref])
+
+
+def pack_scores(profile: Profile) -> bytes:
+    return bytes([profile.genre_scores[g] for g in GENRES] + [profile.situation_scores[t] for t in SITUATION_TAGS])
+
+
+def compact_result(
+    letters: str,
+    profile: Profile,
+    ai_recs: Sequence[dict] = (),
+    local: Optional[List[dict]] = None,
+    ai_error: str = "",
+    path: str = "local",
+    latency_ms: Optional[int] = None,
+    seed: int = 0,
+) -> CompactResult:
+    """build_result without the reason text; a partial AI answer is topped up from the local pick."""
+    candidates = top_up_books(list(ai_recs[:3]), profile.top_genres, profile.second_genres, local, profile.top_situations)
+    return CompactResult(
+        encode_letters(letters), pack_scores(profile), tuple(book_ref(b) for b in candidates),
+        len(ai_recs[:3]), ai_error, path, latency_ms, seed,
+    )
+
+
+def with_books(r: CompactResult, books: Sequence[dict], **changes) -> CompactResult:
+    return r._replace(books=tuple(book_ref(b) for b in books[:3]), **changes)
+
+
+@lru_cache(maxsize=EXPAND_CACHE_SIZE)
+def expand(r: CompactResult) -> dict:
+    """The result dict the app renders (build_result's keys plus latency_ms). Shared: do not mutate."""
+    genre_scores = dict(zip(GENRES, r.scores[:len(GENRES)]))
+    situation_scores = dict(zip(SITUATION_TAGS, r.scores[len(GENRES):]))
+    genre_top = top_keys(genre_scores)[0]
+    situation_top = top_keys(situation_scores)[0]
+    letters = r.letters
+    return {
+        "genre_scores": genre_scores,
+        "genre_top": genre_top,
+        "situation_scores": situation_scores,
+        "situation_top": situation_top,
+        "books": with_reasons(letters, [book_of(b) for b in r.books], situation_top, seed=r.seed),
+        "answers": letters,
+        "used_ai": r.used_ai,
+        "ai_books": r.ai_books,
+        "ai_error": r.ai_error,
+        "path": r.path,
+        "latency_ms": r.latency_ms,
+    }
+
+
+# =====================================================
+# Memory accounting
+# =====================================================
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """sys.getsizeof over containers, counting each object once.
+
+    Strings shared with the catalog or the intern table are counted too, so
+    this is an upper bound on what one session really adds.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+def session_memory(state: Mapping) -> List[dict]:
+    """Bytes per session_state key, largest first, plus what the result would take expanded."""
+    rows = [{"key": str(k), "bytes": deep_sizeof(v)} for k, v in state.items()]
+    r = state.get("result")
+    if isinstance(r, CompactResult):
+        rows.append({"key": "result (펼친 dict)", "bytes": deep_sizeof(expand(r))})
+    return sorted(rows, key=lambda row: -row["bytes"])
+
+
+# =====================================================
+# Report: dict result vs CompactResult over random profiles
+# =====================================================
+def _ai_books(rng: random.Random) -> List[dict]:
+    """Three made-up books that are not in the catalog, as an AI answer can be."""
+    return [
+        {"title": f"도서 {rng.randrange(10000)}", "author": f"저자 {rng.randrange(1000)}", "genre": g}
+        for g in rng.sample(GENRES, 3)
+    ]
+
+
+def report(n: int = 2000, ai: bool = False, seed: int = 0) -> Dict[str, float]:
+    rng = random.Random(seed)
+    full = compact = 0
+    for _ in range(n):
+        letters = decode_letters(rng.randrange(NUM_PROFILES))
+        p = score(letters)
+        local = recommend_local(p.genre_scores, p.situation_scores, noise=0.0)
+        ai_recs = _ai_books(rng) if ai else []
+        c = compact_result(letters, p, ai_recs, local, latency_ms=0)
+        # fresh objects per session, as the app stored them before
+        full += deep_sizeof({**expand.__wrapped__(c)})
+        compact += deep_sizeof(c)
+    return {"profiles": n, "dict_bytes": full / n, "compact_bytes": compact / n, "ratio": full / max(compact, 1)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Per-session result memory: dict vs CompactResult.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("report")
+    rp.add_argument("--n", type=int, default=2000)
+    rp.add_argument("--ai", action="store_true", help="AI books (not in the catalog) instead of catalog picks")
+    rp.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    rep = report(args.n, args.ai, args.seed)
+    print(f"{rep['profiles']} profiles ({'AI' if args.ai else 'catalog'} books)")
+    print(f"  dict result     {rep['dict_bytes']:8.0f} B/session")
+    print(f"  CompactResult   {rep['compact_bytes']:8.0f} B/session  ({rep['ratio']:.1f}x smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
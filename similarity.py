@@ -0,0 +1,120 @@
+"""Vectorized similarity recommender over answer profiles and catalog books.
+
+Profiles and books live in one 9-dim feature space: 5 genre dimensions
+followed by the 4 situation tags (위로/휴식/동기/탐구 order of
+core.SITUATION_TAGS). A profile is its compute_genre_scores and
+compute_situation_scores vectors; a book is its genre one-hot plus its
+tag set. Both blocks are normalized and weighted, so relevance is a dot
+product. Ranking takes the top candidates with argpartition and then picks
+k books by MMR (relevance minus similarity to books already chosen),
+vectorized over a whole batch of profiles. Scores are rounded to
+TIE_DECIMALS before ranking and exact ties go to the lower catalog row,
+so a profile gets the same books alone or in a batch of any shape (the
+matrix products round differently per shape, and books sharing a genre
+and tag set tie exactly).
+"""
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from catalog import Catalog, get_catalog
+from core import GENRES, SITUATION_TAGS
+
+NG, NS = len(GENRES), len(SITUATION_TAGS)
+# well above the float error of the 9-dim products, well below real score gaps
+TIE_DECIMALS = 9
+
+
+def _unit_rows(x: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norm == 0, 1, norm)
+
+
+def _tie_broken(score: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    """score rounded to TIE_DECIMALS, minus a step smaller than that per catalog row number."""
+    return np.round(score, TIE_DECIMALS) - rows * (10.0 ** -TIE_DECIMALS / (n + 1))
+
+
+class SimilarityRecommender:
+    def __init__(
+        self,
+        catalog: Catalog,
+        genre_weight: float = 1.0,
+        tag_weight: float = 0.7,
+        popularity_weight: float = 0.05,
+        candidates: int = 24,
+    ):
+        self.catalog = catalog
+        self.genre_weight = genre_weight
+        self.tag_weight = tag_weight
+        self.candidates = candidates
+
+        tags = ((catalog.tag_mask[:, None] >> np.arange(NS)) & 1).astype(np.float64)
+        genre = np.eye(NG)[catalog.genre]
+        books = np.hstack([genre * genre_weight, _unit_rows(tags) * tag_weight])
+        self.books = _unit_rows(books)
+        # unavailable books can never win; weight acts as a small popularity prior
+        live = catalog.available & (catalog.weight > 0)
+        self.bias = np.where(live, popularity_weight * np.log(np.where(live, catalog.weight, 1.0)), -np.inf)
+
+    def profile_vectors(self, genre_scores: np.ndarray, situation_scores: np.ndarray) -> np.ndarray:
+        """(m, 5) genre score rows + (m, 4) situation score rows -> (m, 9) unit profile vectors."""
+        g = _unit_rows(np.atleast_2d(np.asarray(genre_scores, dtype=np.float64))) * self.genre_weight
+        s = _unit_rows(np.atleast_2d(np.asarray(situation_scores, dtype=np.float64))) * self.tag_weight
+        return _unit_rows(np.hstack([g, s]))
+
+    def recommend_batch(
+        self,
+        genre_scores: np.ndarray,
+        situation_scores: np.ndarray,
+        k: int = 3,
+        diversity: float = 0.3,
+        noise: float = 0.0,
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """(m, k) catalog rows, best first; -1 where the catalog has fewer usable books."""
+        profiles = self.profile_vectors(genre_scores, situation_scores)
+        rel = profiles @ self.books.T + self.bias
+        if noise:
+            rng = rng or np.random.default_rng()
+            rel = rel + noise * rng.standard_normal(rel.shape)
+
+        m, n = rel.shape
+        # the per-row steps also keep exact MMR ties apart: they dwarf the float error of sim
+        rel = _tie_broken(rel, np.arange(n), n)
+        c = min(self.candidates, n)
+        cand = np.argpartition(-rel, c - 1, axis=1)[:, :c] if c < n else np.tile(np.arange(n), (m, 1))
+        cand_rel = np.take_along_axis(rel, cand, axis=1)
+        feats = self.books[cand]  # (m, c, 9)
+        sim = feats @ feats.transpose(0, 2, 1)  # (m, c, c)
+
+        rows = np.arange(m)
+        chosen = np.full((m, k), -1, dtype=np.int64)
+        penalty = np.zeros((m, c))
+        taken = np.zeros((m, c), dtype=bool)
+        for j in range(min(k, c)):
+            score = (1 - diversity) * cand_rel - diversity * penalty
+            score[taken | ~np.isfinite(cand_rel)] = -np.inf
+            best = np.argmax(score, axis=1)
+            ok = np.isfinite(score[rows, best])
+            chosen[ok, j] = cand[rows[ok], best[ok]]
+            taken[rows, best] = True
+            penalty = np.maximum(penalty, sim[rows, best])
+        return chosen
+
+    def recommend(
+        self,
+        genre_scores: Sequence[int],
+        situation_scores: Sequence[int],
+        k: int = 3,
+        diversity: float = 0.3,
+        noise: float = 0.0,
+    ) -> List[int]:
+        out = self.recommend_batch(np.asarray([genre_scores]), np.asarray([situation_scores]), k, diversity, noise)
+        return [int(i) for i in out[0] if i >= 0]
+
+
+@lru_cache(maxsize=None)
+def get_recommender() -> SimilarityRecommender:
+    return SimilarityRecommender(get_catalog())
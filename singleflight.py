@@ -0,0 +1,53 @@
+"""Process-wide request coalescing (single-flight) for AI recommendation calls.
+
+Concurrent calls with the same key share one upstream request: the first
+caller (the leader) runs it and publishes each book into a BookFeed, later
+callers iterate that feed instead of issuing their own request.
+"""
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List
+
+from prefetch import BookFeed
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, BookFeed] = {}
+        self.stats = Counter()
+
+    def stream(self, key: Hashable, fn: Callable[..., Iterable[dict]], *args, **kwargs) -> Iterator[dict]:
+        with self._lock:
+            feed = self._flights.get(key)
+            leader = feed is None
+            if leader:
+                feed = self._flights[key] = BookFeed()
+            self.stats["issued" if leader else "coalesced"] += 1
+
+        if not leader:
+            yield from feed
+            return
+
+        error = None
+        try:
+            for b in fn(*args, **kwargs):
+                feed.push(b)
+                yield b
+        except GeneratorExit:
+            # the leader stopped reading early; followers keep what arrived so far
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            feed.finish(error)
+
+    def do(self, key: Hashable, fn: Callable[..., Iterable[dict]], *args, **kwargs) -> List[dict]:
+        return list(self.stream(key, fn, *args, **kwargs))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
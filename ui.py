@@ -0,0 +1,87 @@
+"""Static HTML for the Streamlit UI: page CSS, question items and result cards.
+
+These live outside app.py so their caches survive Streamlit reruns (the
+script's own functions are redefined on every run). Each result card is a
+single HTML block, so a card is one markdown element instead of four.
+"""
+import re
+from functools import lru_cache
+from typing import Tuple
+
+from core import question_choices, questions
+
+PAGE_STYLE = """
+.block-container { padding-top: 2rem; padding-bottom: 2rem; max-width: 860px; }
+.small-muted { color: rgba(0,0,0,.55); font-size: 0.9rem; margin-top: .2rem; }
+.result-card {
+  border: 1px solid rgba(0,0,0,.08);
+  border-radius: 18px;
+  padding: 18px 18px;
+  background: rgba(255,255,255,.65);
+  box-shadow: 0 8px 22px rgba(0,0,0,.06);
+  margin: 14px 0 18px 0;
+}
+.pill {
+  display:inline-block;
+  padding: 6px 10px;
+  border-radius: 999px;
+  border: 1px solid rgba(0,0,0,.08);
+  background: rgba(0,0,0,.03);
+  font-size: 0.82rem;
+  margin-right: 6px;
+  margin-bottom: 6px;
+}
+.title-row { display:flex; gap:10px; align-items: baseline; flex-wrap: wrap; }
+.book-title { font-size: 1.15rem; font-weight: 800; margin: 0; }
+.book-meta { color: rgba(0,0,0,.62); font-size: 0.92rem; margin: 0.2rem 0 0 0; }
+.why-box {
+  border-radius: 14px;
+  padding: 12px 14px;
+  border: 1px solid rgba(0,0,0,.08);
+  background: rgba(255,255,255,.75);
+  margin-top: 10px;
+}
+.why-label { font-weight: 700; margin-bottom: 6px; }
+.divider-soft { height: 1px; background: rgba(0,0,0,.06); margin: 14px 0; }
+/* spacing below each question (was an empty st.write element per question) */
+div[data-testid="stRadio"] { margin-bottom: 1rem; }
+"""
+
+
+def page_css() -> str:
+    """The <style> block with whitespace collapsed (sent on every full rerun)."""
+    return "<style>" + re.sub(r"\s+", " ", PAGE_STYLE).strip() + "</style>"
+
+
+def question_items() -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """(bold question markdown, choices) per question."""
+    return tuple((f"**{q}**", tuple(c)) for q, c in zip(questions, question_choices))
+
+
+@lru_cache(maxsize=4096)
+def book_card_html(idx: int, title: str, author: str, genre: str, why: str) -> str:
+    title, author, genre, why = title.strip(), author.strip(), genre.strip(), why.strip()
+    genre_pill = f'<span class="pill">🏷️ {genre}</span>' if genre else ""
+    why_box = f'<div class="why-box"><div class="why-label">✨ 추천 이유</div><div>{why}</div></div>' if why else ""
+    return (
+        '<div class="result-card">'
+        f'<div class="title-row"><span class="pill">#{idx}</span>{genre_pill}</div>'
+        f'<div class="book-title">{title}</div>'
+        f'<div class="book-meta">{("저자: " + author) if author else ""}</div>'
+        f"{why_box}"
+        "</div>"
+    )
+
+
+@lru_cache(maxsize=1024)
+def summary_card_html(genre_text: str, sit_text: str, note: str) -> str:
+    return (
+        '<div class="result-card">'
+        '<div class="title-row"><div class="pill">📚 성향</div>'
+        f'<div style="font-size:1.05rem; font-weight:800;">{genre_text}</div></div>'
+        '<div style="margin-top:10px;" class="title-row"><div class="pill">🎯 지금 필요한 것</div>'
+        f'<div style="font-size:1.02rem; font-weight:750;">{sit_text}</div></div>'
+        '<div class="divider-soft"></div>'
+        f'<div class="small-muted">{note}</div>'
+        "</div>"
+    )